@@ -0,0 +1,158 @@
+import argparse
+import difflib
+import json
+import os
+import resource
+import sys
+import time
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPOSITORY_PATH, os.path.join(REPOSITORY_PATH, "project")]
+
+import BPMNStarter
+import project.LLM_API as LLM_API
+from project.Constant import LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES
+from project.LLM_Cache import LLMResponseCache
+from project.Profiler import profiler
+from project.Utilities import open_file
+
+BENCHMARK_PATH = f"{REPOSITORY_PATH}/evaluation/benchmark"
+
+# corpus name -> (path of text number i, title of text number i, refine the text with the LLM-assisted refinement)
+CORPORA = {
+    "gold_standard": (lambda i: f"{REPOSITORY_PATH}/evaluation/gold_standard/Text{i}.txt",
+                      lambda i: f"text{i}_gold_standard", True),
+    "LLM_ATR_results": (lambda i: f"{REPOSITORY_PATH}/evaluation/LLM_ATR_results/text{i}_our_approach.txt",
+                        lambda i: f"text{i}_our_approach", False),
+}
+
+
+def get_peak_memory_mb() -> float:
+    """
+    Returns:
+        the memory high-water mark (maximum resident set size) of the process in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def compare_syntax(syntax: str, baseline_path: str) -> dict:
+    """
+    Compare the generated syntax with the stored baseline syntax.
+    Returns:
+        the status ("unchanged", "changed" or "no baseline") and the number of changed lines
+    """
+    if not os.path.exists(baseline_path):
+        return {"output": "no baseline", "changed_lines": None}
+    diff = [line for line in difflib.unified_diff(open_file(baseline_path).splitlines(), syntax.splitlines(),
+                                                  lineterm="", n=0)
+            if line.startswith(("+", "-")) and not line.startswith(("+++", "---"))]
+    return {"output": "unchanged" if len(diff) == 0 else "changed", "changed_lines": len(diff), "diff": diff}
+
+
+def run_text(nlp, nlp_similarity, corpus: str, number: int, update_baseline: bool) -> dict:
+    """
+    Generate the BPMN model of a single text and compare its syntax with the baseline.
+    Returns:
+        the duration, the result of the comparison and the error if one occurred
+    """
+    path, title, refine = CORPORA[corpus][0](number), CORPORA[corpus][1](number), CORPORA[corpus][2]
+    baseline_path = f"{BENCHMARK_PATH}/baseline/{corpus}/{title}.txt"
+    result = {"corpus": corpus, "text": number, "title": title}
+    start = time.perf_counter()
+    try:
+        syntax = BPMNStarter.start_task_from_text(nlp, nlp_similarity, open_file(path), title,
+                                                  f"{BENCHMARK_PATH}/output/{title}.png", refine=refine)
+        result["status"] = "finished"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+        syntax = None
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    if syntax is not None:
+        if update_baseline:
+            os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+            with open(baseline_path, "w") as file:
+                file.write(syntax)
+        result.update(compare_syntax(syntax, baseline_path))
+    return result
+
+
+def compare_with_report(summary: dict, report_path: str, max_slowdown: float) -> [str]:
+    """
+    Compare the wall time of the stages with a previous report.
+    Returns:
+        the stages that are slower than max_slowdown times the previous report
+    """
+    with open(report_path, "r") as file:
+        previous = json.load(file)["summary"]["stages"]
+    regressions = []
+    for stage, entry in summary["stages"].items():
+        if stage in previous and previous[stage]["wall_seconds"] > 0:
+            factor = entry["wall_seconds"] / previous[stage]["wall_seconds"]
+            if factor > max_slowdown:
+                regressions.append(f"{stage}: {previous[stage]['wall_seconds']}s -> {entry['wall_seconds']}s")
+    return regressions
+
+
+if __name__ == '__main__':
+    """
+    Benchmark the full pipeline over the gold standard texts offline: the LLM responses are served from the recorded
+    responses of the LLM cache (replay-only, a response that has not been recorded fails the text).
+    Record the responses once by running the benchmark with --record (this sends the missing requests to the API).
+    Delete the parse cache for cold parsing times.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the BPMN generation over the gold standard texts")
+    parser.add_argument("--texts", type=int, nargs="+", default=list(range(1, 24)))
+    parser.add_argument("--corpora", nargs="+", default=list(CORPORA.keys()), choices=list(CORPORA.keys()))
+    parser.add_argument("--responses", default=LLM_CACHE_PATH, help="SQLite file with the recorded LLM responses")
+    parser.add_argument("--record", action="store_true", help="send requests that have not been recorded yet")
+    parser.add_argument("--update-baseline", action="store_true", help="store the generated syntax as baseline")
+    parser.add_argument("--compare", default=None, help="previous report to check the stage latencies against")
+    parser.add_argument("--max-slowdown", type=float, default=1.2)
+    parser.add_argument("--output", default=f"{BENCHMARK_PATH}/benchmark_report.json")
+    args = parser.parse_args()
+
+    LLM_API.response_cache = LLMResponseCache(args.responses, max_entries=LLM_CACHE_MAX_ENTRIES,
+                                              replay_only=not args.record)
+    profiler.enabled = True
+    os.makedirs(f"{BENCHMARK_PATH}/output", exist_ok=True)
+
+    load_start = time.perf_counter()
+    nlp, nlp_similarity = BPMNStarter.load_spacy_models()
+    load_seconds = time.perf_counter() - load_start
+
+    results = []
+    start = time.perf_counter()
+    for corpus in args.corpora:
+        for number in args.texts:
+            results.append(run_text(nlp, nlp_similarity, corpus, number, args.update_baseline))
+            print({key: value for key, value in results[-1].items() if key != "diff"})
+    seconds = time.perf_counter() - start
+
+    finished = [result for result in results if result["status"] == "finished"]
+    summary = {
+        "texts": len(results),
+        "finished": len(finished),
+        "failed": len(results) - len(finished),
+        "changed_outputs": len([result for result in finished if result.get("output") == "changed"]),
+        "model_loading_seconds": round(load_seconds, 2),
+        "wall_seconds": round(seconds, 2),
+        "texts_per_minute": round(len(results) / seconds * 60, 2) if seconds > 0 else 0.0,
+        "peak_memory_mb": get_peak_memory_mb(),
+        "llm_cache": LLM_API.get_llm_cache_statistics(),
+        **profiler.summary(),
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump({"summary": summary, "results": results}, file, indent=2)
+    profiler.save("benchmark", BENCHMARK_PATH)
+    print(json.dumps({key: value for key, value in summary.items() if key != "documents"}, indent=2))
+
+    failed = summary["failed"] > 0 or summary["changed_outputs"] > 0
+    if args.compare is not None:
+        regressions = compare_with_report(summary, args.compare, args.max_slowdown)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        failed = failed or len(regressions) > 0
+    sys.exit(1 if failed else 0)
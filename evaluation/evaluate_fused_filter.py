@@ -0,0 +1,106 @@
+import argparse
+import difflib
+import json
+import os
+import sys
+import time
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPOSITORY_PATH, os.path.join(REPOSITORY_PATH, "project")]
+
+import spacy
+
+from project.LLM_API import get_llm_metrics, reset_llm_metrics
+from project.LLM_ATR import LLMAssistedRefinement
+from project.Utilities import open_file
+
+
+def word_similarity(text1: str, text2: str) -> float:
+    """
+    Returns:
+        the similarity of the two texts on word level, between 0 and 1
+    """
+    return round(difflib.SequenceMatcher(None, text1.split(), text2.split()).ratio(), 3)
+
+
+def evaluate_text(nlp, number: int, mode: str) -> dict:
+    """
+    Refine the gold standard text with the given mode and compare it to the stored result of the sequential filters.
+    Args:
+        nlp: the spacy model for the sentence splitting
+        number: the number of the text
+        mode: "sequential" (one request per filter criterion) or "fused" (one request for all filter criteria)
+    Returns:
+        the latency, the number of LLM requests, the similarity to the stored sequential result and how often each
+        rule of the fused filter fired
+    """
+    text_input = open_file(f"{REPOSITORY_PATH}/evaluation/gold_standard/Text{number}.txt")
+    reference = open_file(f"{REPOSITORY_PATH}/evaluation/LLM_ATR_results/text{number}_our_approach.txt")
+    reset_llm_metrics()
+    start = time.perf_counter()
+    refinement = LLMAssistedRefinement(nlp, fused_filter=mode == "fused")
+    result = refinement.refine(text_input, f"text{number}_{mode}_filter")
+    seconds = time.perf_counter() - start
+    metrics = get_llm_metrics()
+    fired_rules = {}
+    for rules in refinement.filter_rules.values():
+        for rule in rules or []:
+            fired_rules[str(rule)] = fired_rules.get(str(rule), 0) + 1
+    return {
+        "text": number,
+        "mode": mode,
+        "seconds": round(seconds, 2),
+        "llm_requests": sum(model["calls"] for model in metrics.values()),
+        "llm_seconds": round(sum(model["total_seconds"] for model in metrics.values()), 2),
+        "similarity_to_reference": word_similarity(result.replace("\n", " "), reference),
+        "fired_rules": fired_rules,
+        "filtered_sentences": len([rules for rules in refinement.filter_rules.values() if rules]),
+        "fallback_sentences": len([rules for rules in refinement.filter_rules.values() if rules is None]),
+    }
+
+
+def summarize(results: [dict], mode: str) -> dict:
+    mode_results = [result for result in results if result["mode"] == mode]
+    if len(mode_results) == 0:
+        return {}
+    fired_rules = {}
+    for result in mode_results:
+        for rule, count in result["fired_rules"].items():
+            fired_rules[rule] = fired_rules.get(rule, 0) + count
+    return {
+        "texts": len(mode_results),
+        "avg_seconds": round(sum(r["seconds"] for r in mode_results) / len(mode_results), 2),
+        "total_llm_requests": sum(r["llm_requests"] for r in mode_results),
+        "avg_similarity_to_reference": round(
+            sum(r["similarity_to_reference"] for r in mode_results) / len(mode_results), 3),
+        "fired_rules": dict(sorted(fired_rules.items(), key=lambda item: int(item[0]))),
+        "fallback_sentences": sum(r["fallback_sentences"] for r in mode_results),
+    }
+
+
+if __name__ == '__main__':
+    """
+    Quantify the quality/latency trade-off of the fused filter stage against the sequential filter prompts.
+    The quality is measured as similarity to the refined texts in evaluation/LLM_ATR_results.
+    Deactivate LLM_cache in Constant.py to measure the latency of the LLM requests instead of the cache.
+    """
+    parser = argparse.ArgumentParser(description="Evaluate the fused filter stage of the LLM-assisted refinement")
+    parser.add_argument("--texts", type=int, nargs="+", default=list(range(1, 24)))
+    parser.add_argument("--modes", nargs="+", default=["sequential", "fused"], choices=["sequential", "fused"])
+    parser.add_argument("--output", default=f"{REPOSITORY_PATH}/evaluation/fused_filter_evaluation.json")
+    args = parser.parse_args()
+
+    nlp = spacy.load('en_core_web_trf')
+    results = []
+    for number in args.texts:
+        for mode in args.modes:
+            try:
+                results.append(evaluate_text(nlp, number, mode))
+                print(results[-1])
+            except Exception as e:
+                print(f"Error for text {number} ({mode}): {e}")
+
+    summary = {mode: summarize(results, mode) for mode in args.modes}
+    print(json.dumps(summary, indent=2))
+    with open(args.output, "w") as file:
+        json.dump({"summary": summary, "results": results}, file, indent=2)
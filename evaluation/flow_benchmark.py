@@ -0,0 +1,145 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPOSITORY_PATH, os.path.join(REPOSITORY_PATH, "project")]
+
+from AnalyzeText import construct, build_flows, determine_end_activities
+from BPMNCreator import create_bpmn_description
+from Model.Process import Process
+from Model.SentenceContainer import SentenceContainer
+from Structure.Activity import Activity
+from Structure.Block import ConditionBlock, AndBlock, ConditionType
+
+
+class SyntheticAction:
+    """
+    Stand-in for an extracted action with the attributes that the structure passes read, so that flows of any size can
+    be built without parsing a text.
+    """
+
+    def __init__(self, number: int, marker=None):
+        self.number = number
+        self.marker = marker
+        self.link_type = None
+        self.active = True
+        self.object = None
+        self.subclause = None
+        self.token = SimpleNamespace(dep_="ROOT", pos_="VERB", lemma_="check", text="check")
+
+    def __str__(self):
+        return f"check item {self.number}"
+
+
+def create_container(number: int, marker=None) -> SentenceContainer:
+    container = SentenceContainer(None)
+    process = Process(None)
+    process.action = SyntheticAction(number, marker)
+    container.processes.append(process)
+    return container
+
+
+def create_containers(size: int) -> [SentenceContainer]:
+    """
+    Returns:
+        containers of size activities, every tenth activity is the condition of a gateway followed by its else branch
+    """
+    containers = []
+    for number in range(size):
+        if number % 10 == 8:
+            containers.append(create_container(number, "if"))
+        elif number % 10 == 9:
+            containers.append(create_container(number, "else"))
+        else:
+            containers.append(create_container(number))
+    return containers
+
+
+def create_block(block_type, size: int):
+    """
+    Returns:
+        a gateway with two branches of size / 2 activities
+    """
+    block = block_type()
+    for branch in range(2):
+        activities = [Activity(create_container(number).processes[0]) for number in range(size // 2)]
+        if block_type == ConditionBlock:
+            block.branches.append({"type": ConditionType.IF, "condition": [], "actions": activities})
+        else:
+            block.branches.append(activities)
+    return block
+
+
+def measure(function) -> float:
+    with contextlib.redirect_stdout(io.StringIO()):  # the passes print every activity
+        start = time.perf_counter()
+        function()
+        return time.perf_counter() - start
+
+
+def run_passes(size: int) -> dict:
+    """
+    Returns:
+        the seconds of every structure pass over a synthetic flow of size activities
+    """
+    containers = create_containers(size)
+    flows = build_flows(containers)
+    condition_block = create_block(ConditionBlock, size)
+    and_block = create_block(AndBlock, size)
+    return {
+        "construct": measure(lambda: construct(containers)),
+        "build_flows": measure(lambda: build_flows(containers)),
+        "determine_end_activities": measure(lambda: determine_end_activities(flows, "")),
+        "create_bpmn_description": measure(lambda: create_bpmn_description(flows, [], "benchmark")),
+        "ConditionBlock.__str__": measure(lambda: str(condition_block)),
+        "AndBlock.__str__": measure(lambda: str(and_block)),
+    }
+
+
+def scaling_exponent(sizes: [int], seconds: [float]) -> float:
+    """
+    Returns:
+        the exponent k of seconds ~ size^k between the smallest and the largest size (1 for linear scaling)
+    """
+    if seconds[0] <= 0 or seconds[-1] <= 0:
+        return 0.0
+    return math.log(seconds[-1] / seconds[0]) / math.log(sizes[-1] / sizes[0])
+
+
+if __name__ == '__main__':
+    """
+    Micro-benchmark of the passes over the structure list with synthetic flows, the passes must scale linearly with
+    the number of activities. The exit code is 1 if a pass grows faster than size^max-exponent.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the structure passes over synthetic flows")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1250, 2500, 5000, 10000])
+    parser.add_argument("--repeat", type=int, default=3, help="the fastest of the repetitions is reported")
+    parser.add_argument("--max-exponent", type=float, default=1.3)
+    args = parser.parse_args()
+
+    sizes = sorted(args.sizes)
+    results = {}
+    for size in sizes:
+        repetitions = [run_passes(size) for _ in range(args.repeat)]
+        for name in repetitions[0]:
+            results.setdefault(name, []).append(min(repetition[name] for repetition in repetitions))
+
+    report = {}
+    for name, seconds in results.items():
+        report[name] = {
+            "seconds": dict(zip(sizes, [round(value, 4) for value in seconds])),
+            "exponent": round(scaling_exponent(sizes, seconds), 2),
+        }
+    print(json.dumps(report, indent=2))
+
+    quadratic = [name for name, entry in report.items() if entry["exponent"] > args.max_exponent]
+    for name in quadratic:
+        print(f"Not linear: {name} grows with size^{report[name]['exponent']}")
+    sys.exit(1 if len(quadratic) > 0 else 0)
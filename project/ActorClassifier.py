@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+
+from Constant import PERSON_CORRECTOR_LIST, SUBJECT_PRONOUNS, LLM_real_actor, ACTOR_LEXICON_PATH
+from Model.Actor import Actor
+from WordNetWrapper import can_be, decide_if_real_actor
+
+from project.LLM_API import generate_response_GPT4_model, normalize_boolean_result, format_numbered_list, \
+    parse_numbered_response
+
+
+def normalize_actor_name(full_name: str) -> str:
+    return " ".join(full_name.lower().split())
+
+
+class ActorClassifier:
+    """
+    Decides if an actor is a real actor (a person, an organization or a software system).
+    The decision of WordNet is memoized per actor name. Actors that WordNet can not decide are collected per document
+    and classified by the LLM with a single request, the verdicts are kept in a lexicon on disk that is seeded with the
+    PERSON_CORRECTOR_LIST.
+    """
+
+    def __init__(self, lexicon_path: str = ACTOR_LEXICON_PATH):
+        self.lexicon_path = lexicon_path
+        self.lexicon = self.load_lexicon()
+        self.wordnet_decisions = {}
+        self.pending = {}  # actor name -> actors that wait for the decision of the LLM
+        self.lock = threading.Lock()
+
+    def load_lexicon(self) -> dict:
+        lexicon = self.read_lexicon_file()
+        for name in PERSON_CORRECTOR_LIST:
+            lexicon[normalize_actor_name(name)] = True
+        return lexicon
+
+    def read_lexicon_file(self) -> dict:
+        if self.lexicon_path is None or not os.path.exists(self.lexicon_path):
+            return {}
+        try:
+            with open(self.lexicon_path, "r") as file:
+                return json.load(file)
+        except Exception as e:
+            print(f"Could not load actor lexicon {self.lexicon_path}: {e}")
+            return {}
+
+    def save_lexicon(self):
+        """
+        Save the lexicon, the processes of a batch share the lexicon file: the verdicts that other processes have saved
+        in the meantime are merged first, and the file is replaced at once, so that it is never read partly written.
+        """
+        if self.lexicon_path is None:
+            return
+        os.makedirs(os.path.dirname(self.lexicon_path), exist_ok=True)
+        lexicon = self.read_lexicon_file()
+        lexicon.update(self.lexicon)
+        self.lexicon = lexicon
+        temporary_path = f"{self.lexicon_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(self.lexicon, file, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.lexicon_path)
+
+    def classify(self, actor: Actor, full_noun: str, main_noun):
+        """
+        Set actor.is_real_actor. If neither the lexicon nor WordNet can decide, the actor stays a real actor until the
+        pending actors are resolved by the LLM (see resolve_pending).
+        Args:
+            actor: the actor to be classified
+            full_noun: the complete name of the actor
+            main_noun: the main token of the actor
+        """
+        name = normalize_actor_name(full_noun)
+        if name in PERSON_CORRECTOR_LIST:
+            return
+        elif main_noun.text.lower() in SUBJECT_PRONOUNS or main_noun.pos_ == "PRON":
+            actor.is_real_actor = False
+            return
+
+        with self.lock:
+            if name not in self.wordnet_decisions:
+                synsets = main_noun._.wordnet.synsets()
+                if len(synsets) == 0:
+                    self.wordnet_decisions[name] = False
+                elif can_be(synsets[0]):
+                    self.wordnet_decisions[name] = True
+                else:
+                    self.wordnet_decisions[name] = None  # WordNet can not decide
+            decision = self.wordnet_decisions[name]
+
+            if decision is None and LLM_real_actor:
+                decision = self.lexicon.get(name)
+                if decision is None:
+                    self.pending.setdefault(name, []).append(actor)
+                    return
+            actor.is_real_actor = bool(decision)
+
+    def resolve_pending(self):
+        """
+        Classify all pending actor names with a single LLM request and update their actors. If the response can not be
+        aligned with the names, every name is classified with its own request.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if len(pending) == 0:
+            return
+
+        names = list(pending.keys())
+        decisions = decide_if_real_actors(names)
+        with self.lock:
+            for name, decision in zip(names, decisions):
+                self.lexicon[name] = decision
+                for actor in pending[name]:
+                    actor.is_real_actor = decision
+            try:
+                self.save_lexicon()
+            except Exception as e:
+                print(f"Could not save actor lexicon {self.lexicon_path}: {e}")
+
+
+def decide_if_real_actors(names: [str]) -> [bool]:
+    """
+    Decide for multiple texts with a single request if they describe real actors.
+    Args:
+        names: the texts to be classified
+    Returns:
+        the decision per text, in the order of the texts
+    """
+    if len(names) == 1:
+        return [decide_if_real_actor(names[0])]
+
+    prompt = (f"""
+        Defintion of a real actor: A real actor is a person, a group, a department, a system, a place location, a profession or a occupation that is involved in the process.
+        The texts are numbered in the format "<number>: <text>". Return exactly one line per text in the same order and in the format "<number>: True" or "<number>: False".
+        Carefully determine for every text if it describes a real actor (based on the definition of a real actor):
+        ### Texts: ###
+        {format_numbered_list(names)}
+        """)
+    results = parse_numbered_response(generate_response_GPT4_model(prompt, stage="real_actor").strip(), len(names))
+    try:
+        if results is not None:
+            decisions = [normalize_boolean_result(result) for result in results]
+            print(f"decide_if_real_actors: {dict(zip(names, decisions))}")
+            return decisions
+    except ValueError:
+        pass
+    print("Actor classification could not be aligned, classify the actors one by one")
+    return [bool(decide_if_real_actor(name)) for name in names]
+
+
+actor_classifier = ActorClassifier()
@@ -5,6 +5,7 @@ from Model.Resource import Resource
 from Model.SentenceContainer import SentenceContainer
 from Utilities import find_dependency
 from ModelBuilder import create_actor, create_action, correct_model
+from ActorClassifier import actor_classifier
 
 
 def sub_sentence_finder(sentence: Span) -> [Span]:
@@ -76,19 +77,22 @@ def add_index(index_list, index):
         return index_list
 
 
-def analyze_document(doc: Doc) -> [SentenceContainer]:
+def analyze_document(doc: Doc, sentences=None, resolve_actors: bool = True) -> [SentenceContainer]:
     """Analyze the document and return a list of SentenceContainer which contains the extracted information stored in
         the models.
 
        Args:
            nlp: The spacy language model
            doc: The document that contains the sentence
+           sentences: the sentences of the document that are analyzed, all sentences if None
+           resolve_actors: if False, the actors that WordNet could not classify stay pending, so that the caller can
+               classify the actors of multiple calls with one LLM request (actor_classifier.resolve_pending)
 
        Returns:
            A list SentenceContainer
     """
     container_list = []
-    for sentence in doc.sents:
+    for sentence in (doc.sents if sentences is None else sentences):
         container = SentenceContainer(sentence)
         container_list.append(container)
 
@@ -104,6 +108,8 @@ def analyze_document(doc: Doc) -> [SentenceContainer]:
         correct_model(sentence)
         complement_model(sentence)
 
+    if resolve_actors:
+        actor_classifier.resolve_pending()  # actors that WordNet could not classify, with one LLM request per document
     return container_list
 
 
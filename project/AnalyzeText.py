@@ -1,4 +1,5 @@
-from spacy.matcher import Matcher
+import numpy as np
+
 import Constant
 from spacy import Language
 from Model.Action import LinkType
@@ -7,9 +8,11 @@ from Model.SentenceContainer import SentenceContainer
 from Structure.Activity import Activity
 from Structure.Block import ConditionBlock, AndBlock, ConditionType
 from Structure.Structure import LinkedStructure, Structure
-from Utilities import find_dependency, find_action, contains_indicator, find_process, contains_any
+from Utilities import find_dependency, find_action, find_process, contains_any
 from WordNetWrapper import hypernyms_checker, verb_hypernyms_checker
-from project.LLM_API import normalize_boolean_result, generate_response_GPT4_model
+from project.IndicatorMatcher import find_indicator_matches, contains_indicator_match, get_indicator_spans
+from project.LLM_API import normalize_boolean_result, generate_response_GPT4_model, format_numbered_list, \
+    parse_numbered_response
 
 
 def determine_marker(container: SentenceContainer, nlp: Language):
@@ -21,9 +24,10 @@ def determine_marker(container: SentenceContainer, nlp: Language):
         nlp: The nlp language object.
 
     """
+    matches = find_indicator_matches(container.sentence)
     determine_single_marker(container)
-    determine_compound_marker(container, nlp)
-    determine_jump_case_marker(container, nlp)
+    determine_compound_marker(container, nlp, matches)
+    determine_jump_case_marker(container, nlp, matches)
 
 
 def determine_single_marker(container: SentenceContainer):
@@ -76,15 +80,18 @@ def determine_single_marker(container: SentenceContainer):
             action.prep = prep
 
 
-def determine_compound_marker(container: SentenceContainer, nlp: Language):
+def determine_compound_marker(container: SentenceContainer, nlp: Language, matches=None):
     """
     Determines the marker of the action that is composed of multiple words in the given container.
 
     Args:
         container: The container that contains the action.
         nlp: The nlp language object.
+        matches: The indicator matches of the sentence, they are determined if not given.
 
     """
+    if matches is None:
+        matches = find_indicator_matches(container.sentence)
     for process in container.processes:
         if process.action is None:
             continue
@@ -92,15 +99,15 @@ def determine_compound_marker(container: SentenceContainer, nlp: Language):
         if process.action.marker is not None:
             continue
 
-        if contains_indicator(Constant.COMPOUND_CONDITIONAL_INDICATORS, process.sub_sentence, nlp):
+        if contains_indicator_match(matches, "COMPOUND_CONDITIONAL", process.sub_sentence):
             process.action.marker = "if"
-        elif contains_indicator(Constant.COMPOUND_PARALLEL_INDICATORS, process.sub_sentence, nlp):
+        elif contains_indicator_match(matches, "COMPOUND_PARALLEL", process.sub_sentence):
             process.action.marker = "while"
-        elif contains_indicator(Constant.COMPOUND_SEQUENCE_INDICATORS, process.sub_sentence, nlp):
+        elif contains_indicator_match(matches, "COMPOUND_SEQUENCE", process.sub_sentence):
             process.action.marker = "then"
 
 
-def determine_jump_case_marker(container: SentenceContainer, nlp: Language):
+def determine_jump_case_marker(container: SentenceContainer, nlp: Language, matches=None):
     """
     Determines whether the sentence contains an "in former/ latter case" expression. If so, mark that action as a
     jump case, which should later be added to a gateway
@@ -108,21 +115,18 @@ def determine_jump_case_marker(container: SentenceContainer, nlp: Language):
     Args:
         container: The container that contains the action.
         nlp: The nlp language object.
+        matches: The indicator matches of the sentence, they are determined if not given.
 
     """
+    if matches is None:
+        matches = find_indicator_matches(container.sentence)
     for process in container.processes:
         if process.action is None:
             continue
 
-        matcher = Matcher(nlp.vocab)
-        for rule in Constant.CASE_INDICATORS:
-            for k, v in rule.items():
-                matcher.add(k, [v])
-
-        matches = matcher(process.sub_sentence)
-        if len(matches) > 0:
-            for match_id, start, end in matches:
-                matched_span = process.sub_sentence[start:end]
+        matched_spans = get_indicator_spans(matches, "CASE", process.sub_sentence)
+        if len(matched_spans) > 0:
+            for matched_span in matched_spans:
                 sent = matched_span.text
                 if "former" in sent.lower():
                     process.action.link_type = LinkType.TO_PREV
@@ -204,7 +208,7 @@ def describe_process_start(process: Process):
     return False
 
 
-def determine_end_activities(structure_list: [Structure], text_input: str):
+def determine_end_activities(structure_list: [Structure], text_input: str, known_decisions: dict = None):
     """
     determine whether an activity is an end activity. there are two cases:
     1. the last activity in the list is an end activity
@@ -214,9 +218,13 @@ def determine_end_activities(structure_list: [Structure], text_input: str):
      of "message", then it is an end activity
     Args:
         structure_list: the list of structures that contains the activities.
+        text_input: the text description, used by the LLM to decide if the activities of the branches end the process
+        known_decisions: if not None, the decisions of the LLM per (sentence, activity) from a previous run of the
+            same text, the activities contained in it are not sent again and the new decisions are added to it
     """
-    for structure in structure_list:
-        if structure_list.index(structure) == len(structure_list) - 1:
+    candidates = []
+    for i, structure in enumerate(structure_list):
+        if i == len(structure_list) - 1:
             structure.is_end_activity = True
             # if Constant.filter_finish_activities:
             #   determine_finish_activity(structure)
@@ -225,7 +233,7 @@ def determine_end_activities(structure_list: [Structure], text_input: str):
             if Constant.filter_finish_activities:
                 determine_finish_activity(structure)
                 if structure.is_finish_activity:
-                    previous_structure = structure_list[structure_list.index(structure) - 1]
+                    previous_structure = structure_list[i - 1]
                     previous_structure.is_end_activity = True
         elif isinstance(structure, ConditionBlock):
             for branch in structure.branches:
@@ -247,11 +255,22 @@ def determine_end_activities(structure_list: [Structure], text_input: str):
                                 verb_hypernyms_checker(activity.process.action.token, ["refuse"]):
                             activity.is_end_activity = True
                             # continue
-                        elif Constant.filter_finish_activities and decide_if_end_of_process(
-                                str(activity.process.action), text_input):
-                            print(f"101: activity.process.action.token: {activity.process.action.token}")
-                            print(f"101: activity.process.action.str: {str(activity.process.action)}")
-                            activity.is_end_activity = True
+                        elif Constant.filter_finish_activities:
+                            candidates.append(activity)  # decided by the LLM for all candidates at once
+
+    if known_decisions is None:
+        decisions = decide_if_end_of_processes([str(activity.process.action) for activity in candidates], text_input)
+    else:
+        keys = [(activity.process.sub_sentence.sent.text.strip(), str(activity.process.action))
+                for activity in candidates]
+        open_keys = list(dict.fromkeys(key for key in keys if key not in known_decisions))
+        known_decisions.update(zip(open_keys, decide_if_end_of_processes([key[1] for key in open_keys], text_input)))
+        decisions = [known_decisions[key] for key in keys]
+    for activity, decision in zip(candidates, decisions):
+        if decision:
+            print(f"101: activity.process.action.token: {activity.process.action.token}")
+            print(f"101: activity.process.action.str: {str(activity.process.action)}")
+            activity.is_end_activity = True
 
 
 def decide_if_end_of_process(activity: str, text_input: str) -> bool:
@@ -271,7 +290,7 @@ def decide_if_end_of_process(activity: str, text_input: str) -> bool:
         return False
     else:
         result = ""
-        result = generate_response_GPT4_model(prompt)
+        result = generate_response_GPT4_model(prompt, stage="end_activity")
         result = result.strip()
         print(f"prompt: Activity is End: {result}: {activity}")
         # if debug_mode: print("**** Full description: **** \n" + result.replace("\n", " "))
@@ -279,6 +298,49 @@ def decide_if_end_of_process(activity: str, text_input: str) -> bool:
         return result
 
 
+def decide_if_end_of_processes(activities: [str], text_input: str) -> [bool]:
+    """
+    Decide for multiple activities if they represent the end of the process. All activities are sent with the full
+    text in a single request, if the response can not be aligned with the activities, every activity is decided with
+    its own request (decide_if_end_of_process).
+    Args:
+        activities: the activities to be decided
+        text_input: the text description
+    Returns:
+        the decision per activity, in the order of the activities
+    """
+    decisions = {activity: False for activity in activities if contains_any(activity, Constant.NOT_END_ACTIVITY_VERBS)}
+    open_activities = list(dict.fromkeys(activity for activity in activities if activity not in decisions))
+    if len(open_activities) == 1:
+        decisions[open_activities[0]] = decide_if_end_of_process(open_activities[0], text_input)
+    elif len(open_activities) > 1:
+        prompt = (f"""
+    Please determine carefully based on the process description for each of the following activities if it can represents the end of a process. 
+    The activities are numbered in the format "<number>: <activity>". Return exactly one line per activity in the same order and in the format "<number>: True" if it is the end of the process, or "<number>: False" if it is not. 
+    Use the example as a guide: In the process of repairing a car, if the activity is "customer take car," then this activity signifies the end of the process.
+
+    ### Activities: ###
+    {format_numbered_list(open_activities)}
+
+    ### Full Text: ###
+    {text_input}
+    """)
+        results = parse_numbered_response(generate_response_GPT4_model(prompt, stage="end_activity").strip(),
+                                          len(open_activities))
+        try:
+            if results is None:
+                raise ValueError("Response could not be aligned with the activities")
+            results = [normalize_boolean_result(result) for result in results]
+            for activity, result in zip(open_activities, results):
+                print(f"prompt: Activity is End: {result}: {activity}")
+                decisions[activity] = result
+        except ValueError:
+            print("End activities could not be decided at once, decide the activities one by one")
+            for activity in open_activities:
+                decisions[activity] = decide_if_end_of_process(activity, text_input)
+    return [decisions[activity] for activity in activities]
+
+
 def remove_redundant_end_activities(structure_list: [Structure]):
     for structure in structure_list:
         if isinstance(structure, ConditionBlock):
@@ -312,8 +374,8 @@ def determine_end_activities_backup(structure_list: [Structure]):
     Args:
         structure_list: the list of structures that contains the activities.
     """
-    for structure in structure_list:
-        if structure_list.index(structure) == len(structure_list) - 1:
+    for i, structure in enumerate(structure_list):
+        if i == len(structure_list) - 1:
             structure.is_end_activity = True
         elif isinstance(structure, ConditionBlock):
             for branch in structure.branches:
@@ -344,43 +406,53 @@ def construct(container_list: [SentenceContainer]):
     """
     result = []
     for i in range(len(container_list)):
-        container = container_list[i]
+        add_to_structures(result, container_list[i], last_container_has_conditional_marker(i, container_list))
 
-        if container.has_if() or container.has_else():
-            if last_container_has_conditional_marker(container, container_list):
-                if isinstance(result[-1], ConditionBlock):
-                    if result[-1].can_be_added(container):
-                        result[-1].add_branch(container)
-                    else:
-                        if_block = ConditionBlock()
-                        if_block.add_branch(container)
-                        result.append(if_block)
-            else:
-                if_block = ConditionBlock()
-                if_block.add_branch(container)
-                result.append(if_block)
-
-        elif container.has_while():
-            if isinstance(result[-1], AndBlock):
-                result[-1].add_branch(container)
-            elif not isinstance(result[-1], ConditionBlock):
-                and_block = AndBlock()
-                and_block.add_branch(result[-1])
-                and_block.add_branch(container)
-                result.remove(result[-1])
-                result.append(and_block)
-
-        elif container.has_or():
+    return result
+
+
+def add_to_structures(result: [Structure], container: SentenceContainer, last_has_conditional_marker: bool):
+    """
+    convert the container into the right structure and add it to the constructed structures, only the last structure
+    of the list can be changed by that.
+    Args:
+        result: the structures that have been constructed from the previous containers
+        container: the container that is being converted
+        last_has_conditional_marker: true if the previous container has a conditional marker
+    """
+    if container.has_if() or container.has_else():
+        if last_has_conditional_marker:
+            if isinstance(result[-1], ConditionBlock):
+                if result[-1].can_be_added(container):
+                    result[-1].add_branch(container)
+                else:
+                    if_block = ConditionBlock()
+                    if_block.add_branch(container)
+                    result.append(if_block)
+        else:
             if_block = ConditionBlock()
-            for process in container.or_processes:
-                branch = {"type": ConditionType.ELSE, "condition": [], "actions": [Activity(process)]}
-                if_block.branches.append(branch)
+            if_block.add_branch(container)
             result.append(if_block)
 
-        else:
-            result.append(container)
+    elif container.has_while():
+        if isinstance(result[-1], AndBlock):
+            result[-1].add_branch(container)
+        elif not isinstance(result[-1], ConditionBlock):
+            and_block = AndBlock()
+            and_block.add_branch(result[-1])
+            and_block.add_branch(container)
+            result.remove(result[-1])
+            result.append(and_block)
+
+    elif container.has_or():
+        if_block = ConditionBlock()
+        for process in container.or_processes:
+            branch = {"type": ConditionType.ELSE, "condition": [], "actions": [Activity(process)]}
+            if_block.branches.append(branch)
+        result.append(if_block)
 
-    return result
+    else:
+        result.append(container)
 
 
 def build_flows(container_list: [SentenceContainer]):
@@ -398,28 +470,43 @@ def build_flows(container_list: [SentenceContainer]):
     last_gateway = None
 
     for i in range(len(flow_list)):
-        if isinstance(flow_list[i], ConditionBlock):
-            last_gateway = flow_list[i]
-            if not flow_list[i].is_complete():
-                flow_list[i].create_dummy_branch()
-            result.append(flow_list[i])
-        elif isinstance(flow_list[i], AndBlock):
-            last_gateway = flow_list[i]
-            result.append(flow_list[i])
-        else:
-            for process in flow_list[i].processes:
-                if process.action.link_type == LinkType.TO_PREV:
-                    if last_gateway is not None:
-                        last_gateway.add_to_branch(1, process)
-                elif process.action.link_type == LinkType.TO_NEXT:
-                    if last_gateway is not None:
-                        last_gateway.add_to_branch(0, process)
-                else:
-                    result.append(Activity(process))
+        last_gateway = add_to_flows(result, flow_list[i], last_gateway)
 
     return result
 
 
+def add_to_flows(result: [Structure], structure: Structure, last_gateway):
+    """
+    perform the adjustments of build_flows for a single constructed structure and add it to the flows.
+    Args:
+        result: the flows that have been built from the previous structures
+        structure: the constructed structure, it is not changed by the following containers anymore
+        last_gateway: the last gateway of the previous structures, None if there is none
+
+    Returns:
+        the last gateway after the structure has been added.
+    """
+    if isinstance(structure, ConditionBlock):
+        last_gateway = structure
+        if not structure.is_complete():
+            structure.create_dummy_branch()
+        result.append(structure)
+    elif isinstance(structure, AndBlock):
+        last_gateway = structure
+        result.append(structure)
+    else:
+        for process in structure.processes:
+            if process.action.link_type == LinkType.TO_PREV:
+                if last_gateway is not None:
+                    last_gateway.add_to_branch(1, process)
+            elif process.action.link_type == LinkType.TO_NEXT:
+                if last_gateway is not None:
+                    last_gateway.add_to_branch(0, process)
+            else:
+                result.append(Activity(process))
+    return last_gateway
+
+
 def build_linked_list(container_list: [SentenceContainer]):
     flow_list = construct(container_list)
     link = LinkedStructure()
@@ -447,20 +534,7 @@ def get_valid_actors(container_list: [SentenceContainer], nlp) -> list:
         A list of actors that are real actors.
     """
     if Constant.actors_similarity:
-        result = []
-        for container in container_list:
-            for process in container.processes:
-                if process.actor is not None:
-                    if process.actor.is_real_actor and process.actor.full_name not in result:
-                        temp_bool_add = True
-                        for actor in result:
-                            if compare_actors_similarity(process.actor.determinate_full_name_vh(), actor, nlp):
-                                temp_bool_add = False
-                                process.actor.full_name = actor
-                                break
-                        if temp_bool_add:
-                            result.append(process.actor.full_name)
-        return result
+        return merge_similar_actors(container_list, [], nlp)
     else:
         result = []
         for container in container_list:
@@ -472,6 +546,74 @@ def get_valid_actors(container_list: [SentenceContainer], nlp) -> list:
         return result
 
 
+def merge_similar_actors(container_list: [SentenceContainer], valid_actors: [str], nlp) -> list:
+    """
+    Renames every real actor of the containers that is similar to a valid actor to the first similar valid actor,
+    the other actors are added to the valid actors. The actors are compared in order, so the containers of a text can
+    also be merged one after another (StreamingPipeline.stream_bpmn_fragments).
+    Args:
+        container_list: The container that contains the action.
+        valid_actors: the actors that are accepted so far, the new actors are appended
+        nlp: spacy model with vector similarity
+    Returns:
+        the valid actors
+    """
+    actors = [process.actor for container in container_list for process in container.processes
+              if process.actor is not None and process.actor.is_real_actor]
+    names = list(dict.fromkeys(valid_actors + [name for actor in actors
+                                               for name in [actor.full_name, actor.determinate_full_name_vh()]]))
+    positions = {name: i for i, name in enumerate(names)}
+    similar_names = compute_similar_actor_names(names, nlp)
+    for actor in actors:
+        if actor.full_name not in valid_actors:
+            name = positions[actor.determinate_full_name_vh()]
+            similar_actor = next((accepted for accepted in valid_actors
+                                  if similar_names[name, positions[accepted]]), None)
+            if similar_actor is not None:
+                actor.full_name = similar_actor
+            else:
+                valid_actors.append(actor.full_name)
+    return valid_actors
+
+
+def compute_similar_actor_names(names: [str], nlp) -> np.ndarray:
+    """
+    Compares all actor names with each other like compare_actors_similarity, but parses every name only once and
+    computes the similarity scores of all pairs at once.
+    Args:
+        names: the distinct actor names
+        nlp: spacy model with vector similarity
+    Returns:
+        boolean matrix, entry [i, j] is True if the name i is similar to the name j
+    """
+    criteria_similarity_score = 0.5
+    criteria_similarity_ratio = 0.5
+    docs = list(nlp.pipe(names))
+    if len(docs) == 0:
+        return np.zeros((0, 0), dtype=bool)
+
+    # similarity score: cosine similarity of the document vectors, as Doc.similarity
+    vectors = np.array([doc.vector for doc in docs], dtype=np.float64)
+    norms = np.linalg.norm(vectors, axis=1)
+    norm_products = np.outer(norms, norms)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        similarity_scores = np.where(norm_products > 0, (vectors @ vectors.T) / norm_products, 0.0)
+    # Doc.similarity is 1.0 for documents with the same tokens, also if they have no vectors
+    orths = [tuple(token.orth for token in doc) for doc in docs]
+    for i, orths1 in enumerate(orths):
+        for j, orths2 in enumerate(orths):
+            if orths1 == orths2:
+                similarity_scores[i, j] = 1.0
+    similarity_scores = np.round(similarity_scores, 2)
+
+    # similarity ratio: overlap of the lemmas of the non-stop tokens, as compare_actors_with_token
+    lemmas = [[token.lemma_ for token in doc if not token.is_stop] for doc in docs]
+    similarity_ratios = np.array([[lemma_similarity_ratio(lemmas1, lemmas2) for lemmas2 in lemmas]
+                                  for lemmas1 in lemmas])
+
+    return (similarity_scores > criteria_similarity_score) & (similarity_ratios > criteria_similarity_ratio)
+
+
 def compare_actors_similarity(Actor1: str, Actor2: str, nlp):
     criteria_similarity_score = 0.5
     criteria_similarity_ratio = 0.5
@@ -498,35 +640,30 @@ def compare_actors_with_token(Actor1: str, Actor2: str, nlp):
     tokens1 = [token for token in doc1 if not token.is_stop]
     tokens2 = [token for token in doc2 if not token.is_stop]
 
-    # Count the number of tokens for each actor
-    num_tokens1 = len(tokens1)
-    num_tokens2 = len(tokens2)
+    return lemma_similarity_ratio([token.lemma_ for token in tokens1], [token.lemma_ for token in tokens2])
 
-    # Initialize variables to count matching tokens
-    matching_tokens = 0
 
+def lemma_similarity_ratio(lemmas1: [str], lemmas2: [str]) -> float:
+    """
+    Args:
+        lemmas1: the lemmas of the non-stop tokens of the first actor
+        lemmas2: the lemmas of the non-stop tokens of the second actor
+    Returns:
+        the number of lemmas of the shorter actor that occur in the other actor, divided by the average number of lemmas
+    """
     # Compare the tokens in the actor with fewer tokens with tokens in the other actor
-    if num_tokens1 <= num_tokens2:
-        for token1 in tokens1:
-            for token2 in tokens2:
-                if token1.lemma_ == token2.lemma_:
-                    matching_tokens += 1
-                    break  # Break the inner loop if a match is found
+    if len(lemmas1) <= len(lemmas2):
+        other_lemmas = set(lemmas2)
+        matching_tokens = len([lemma for lemma in lemmas1 if lemma in other_lemmas])
     else:
-        for token2 in tokens2:
-            for token1 in tokens1:
-                if token2.lemma_ == token1.lemma_:
-                    matching_tokens += 1
-                    break  # Break the inner loop if a match is found
+        other_lemmas = set(lemmas1)
+        matching_tokens = len([lemma for lemma in lemmas2 if lemma in other_lemmas])
 
     # Calculate the average number of tokens between the two actors
-    avg_tokens = (num_tokens1 + num_tokens2) / 2.0
+    avg_tokens = (len(lemmas1) + len(lemmas2)) / 2.0
 
     # Calculate the similarity ratio
-    similarity_ratio = matching_tokens / avg_tokens if avg_tokens > 0 else 0.0
-
-    # print("Similarity similarity_ratio:", similarity_ratio)
-    return similarity_ratio
+    return matching_tokens / avg_tokens if avg_tokens > 0 else 0.0
 
 
 def adjust_actor_list(valid_actors: [str]) -> list:
@@ -546,17 +683,16 @@ def adjust_actor_list(valid_actors: [str]) -> list:
     return result
 
 
-def last_container_has_conditional_marker(container: SentenceContainer, container_list: [SentenceContainer]):
+def last_container_has_conditional_marker(index: int, container_list: [SentenceContainer]):
     """
     this function checks whether the last container has a conditional marker.
     Args:
-        container: the container that is being checked.
+        index: the position of the container that is being checked in the container list.
         container_list: the list of containers.
 
     Returns:
         true if the last container has a conditional marker, false otherwise.
     """
-    index = container_list.index(container)
     if index == 0:
         return False
     else:
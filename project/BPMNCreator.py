@@ -20,6 +20,8 @@ def create_bpmn_model(structure_list: [Structure], actor_list: list, title: str,
         title: the title of the BPMN model
         save_path: the path to save the BPMN model
         theme: the theme of the BPMN model, default is BLUEMOUNTAIN
+    Returns:
+        the syntax that was rendered to the BPMN model
     """
 
     input_syntax_rule_based = create_bpmn_description(structure_list, actor_list, title, theme=theme)
@@ -29,13 +31,16 @@ def create_bpmn_model(structure_list: [Structure], actor_list: list, title: str,
             llm_improved_syntax = improve_taks_labeles_LLM(input_syntax_rule_based, text_description)
             llm_improved_syntax = improve_task_labels(llm_improved_syntax)
             render_bpmn_model(llm_improved_syntax, save_path)
+            return llm_improved_syntax
 
         except Exception as e:
             print(f"Error in create_bpmn_model: {e}")
             input_syntax_rule_based = improve_task_labels(input_syntax_rule_based)
             render_bpmn_model(input_syntax_rule_based, save_path)
+            return input_syntax_rule_based
     else:
         render_bpmn_model(input_syntax_rule_based, save_path)
+        return input_syntax_rule_based
 
 
 def improve_task_labels(syntax: str) -> str:
@@ -113,8 +118,8 @@ def create_bpmn_description(structure_list: [Structure], actor_list: list, title
     key = None
     connection_id = 0
     last_gateway = None
-    for structure in structure_list:
-        if structure_list.index(structure) == 0:
+    for position, structure in enumerate(structure_list):
+        if position == 0:
             key = belongs_to_lane(structure_list, lanes, structure, key)
             lanes[key].append("(start) as start")
             connections.append("start")
@@ -144,9 +149,9 @@ def create_bpmn_description(structure_list: [Structure], actor_list: list, title
                     connections.append("gateway_" + str(structure.id) + '-"no"')
                 else:
                     condition = ""
-                    for c in branch["condition"]:
+                    for j, c in enumerate(branch["condition"]):
                         condition += str(c)
-                        if branch["condition"].index(c) != len(branch["condition"]) - 1:
+                        if j != len(branch["condition"]) - 1:
                             condition += ", "
                     index = 0
                     for i in range(len(condition)):
@@ -160,7 +165,7 @@ def create_bpmn_description(structure_list: [Structure], actor_list: list, title
                 for activity in branch["actions"]:
                     print(f"Case 103: Activity: {activity}, activity.is_end_activity: {activity.is_end_activity}")
                     if filter_finish_activities:
-                        previous_activity = structure_list[structure_list.index(structure) - 1]
+                        previous_activity = structure_list[position - 1]
                         print(
                             f"Activity: {activity}, activity.is_end_activity: {activity.is_end_activity}, activity.is_finish_activity: {activity.is_finish_activity}, previous_activity: {previous_activity}, previous_activity.is_end_activity: {previous_activity.is_end_activity}, is_finish_activity: {previous_activity.is_finish_activity}")
                         if activity.is_end_activity and activity.is_finish_activity:
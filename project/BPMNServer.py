@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import BPMNStarter
+from project.Constant import BASE_PATH, SERVER_HOST, SERVER_PORT, SERVER_MAX_SESSIONS, SERVER_JOB_TTL_SECONDS, \
+    SERVER_MAX_JOBS
+from project.IncrementalPipeline import IncrementalSession
+from project.ModelRegistry import model_registry
+
+# The title is part of the output paths (the PNG and the refined text of LLM_ATR), so it must not contain a path
+TITLE_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class BPMNJob:
+    def __init__(self, text_input: str, title: str, output_path: str, incremental: bool = False):
+        self.id: str = uuid.uuid4().hex
+        self.text_input: str = text_input
+        self.title: str = title
+        self.output_path: str = output_path
+        self.incremental: bool = incremental
+        self.status: str = "queued"  # queued -> running -> finished | failed
+        self.syntax: Optional[str] = None
+        self.error: Optional[str] = None
+        self.submitted_at: float = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = threading.Event()
+
+    def latency(self) -> dict:
+        """
+        Returns:
+            the time the job waited in the queue, the time it was processed and the total time in seconds
+        """
+        now = time.time()
+        started_at = self.started_at if self.started_at is not None else now
+        finished_at = self.finished_at if self.finished_at is not None else now
+        return {
+            "queue_seconds": round(started_at - self.submitted_at, 3),
+            "processing_seconds": round(finished_at - started_at, 3) if self.started_at is not None else 0.0,
+            "total_seconds": round(finished_at - self.submitted_at, 3),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "status": self.status,
+            "syntax": self.syntax,
+            "error": self.error,
+            "png": f"/jobs/{self.id}/png" if self.status == "finished" else None,
+            "latency": self.latency(),
+        }
+
+
+class BPMNServer:
+    """
+    Resident service that keeps the spacy models loaded and processes the submitted texts one after another.
+    The models are not thread safe, therefore a single worker thread consumes the job queue.
+    """
+
+    def __init__(self, nlp, nlp_similarity, output_folder: str):
+        self.nlp = nlp
+        self.nlp_similarity = nlp_similarity
+        self.output_folder = output_folder
+        self.jobs: {str: BPMNJob} = {}
+        self.sessions: OrderedDict = OrderedDict()  # title -> session of the incremental jobs, least recently used first
+        self.job_queue: queue.Queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self.work, daemon=True)
+
+    def submit(self, text_input: str, title: str, incremental: bool = False) -> BPMNJob:
+        """
+        Raises:
+            ValueError: if the text is not a string or the title contains other characters than letters, digits,
+                underscores and hyphens (spaces are replaced with underscores)
+        """
+        if not isinstance(text_input, str):
+            raise ValueError("The text has to be a string")
+        if not isinstance(title, str) or TITLE_PATTERN.fullmatch(title.strip().replace(" ", "_")) is None:
+            raise ValueError("The title may only contain letters, digits, spaces, underscores and hyphens")
+        title = title.strip().replace(" ", "_")  # Title has to be without spaces
+        job = BPMNJob(text_input, title, "", incremental)
+        job.output_path = f"{self.output_folder}/{title}_{job.id}.png"
+        with self.lock:
+            self.evict_jobs()
+            self.jobs[job.id] = job
+        self.job_queue.put(job)
+        return job
+
+    def evict_jobs(self):
+        """
+        Drop the finished jobs that are older than SERVER_JOB_TTL_SECONDS and the oldest finished jobs beyond
+        SERVER_MAX_JOBS together with their rendered models, the queued and running jobs are kept. Must be called with
+        the lock.
+        """
+        now = time.time()
+        finished = sorted([job for job in self.jobs.values() if job.finished_at is not None],
+                          key=lambda job: job.finished_at)
+        for i, job in enumerate(finished):
+            if now - job.finished_at > SERVER_JOB_TTL_SECONDS or len(finished) - i > SERVER_MAX_JOBS:
+                del self.jobs[job.id]
+                if os.path.exists(job.output_path):
+                    os.remove(job.output_path)
+
+    def get_job(self, job_id: str) -> Optional[BPMNJob]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def work(self):
+        while True:
+            job = self.job_queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            print(f"Start generating model for {job.title} (job {job.id})")
+            try:
+                if job.incremental:
+                    job.syntax = self.get_session(job.title).update(job.text_input, job.title, job.output_path)
+                else:
+                    job.syntax = BPMNStarter.start_task_from_text(self.nlp, self.nlp_similarity, job.text_input,
+                                                                  job.title, job.output_path)
+                job.status = "finished"
+            except Exception as e:
+                print(f"Error for job {job.id}: {e}")
+                job.error = str(e)
+                job.status = "failed"
+            job.finished_at = time.time()
+            print(f"Finished job {job.id} in {job.latency()['processing_seconds']} seconds")
+            job.done.set()
+            self.job_queue.task_done()
+
+    def get_session(self, title: str) -> IncrementalSession:
+        """
+        Returns:
+            the incremental session of the title, which reuses the results of the unchanged sentences of the previous
+            job, the least recently used sessions are dropped beyond SERVER_MAX_SESSIONS
+        """
+        if title in self.sessions:
+            self.sessions.move_to_end(title)
+        else:
+            self.sessions[title] = IncrementalSession(self.nlp, self.nlp_similarity)
+            while len(self.sessions) > SERVER_MAX_SESSIONS:
+                self.sessions.popitem(last=False)
+        return self.sessions[title]
+
+    def statistics(self) -> dict:
+        with self.lock:
+            self.evict_jobs()
+            jobs = list(self.jobs.values())
+        completed = [job for job in jobs if job.finished_at is not None]
+        processing_times = [job.latency()["processing_seconds"] for job in completed]
+        return {
+            "jobs": len(jobs),
+            "queued": self.job_queue.qsize(),
+            "finished": len([job for job in completed if job.status == "finished"]),
+            "failed": len([job for job in completed if job.status == "failed"]),
+            "avg_processing_seconds": round(sum(processing_times) / len(processing_times), 3)
+            if len(processing_times) > 0 else 0.0,
+            "models": model_registry.statistics(),
+        }
+
+    def serve(self, host: str, port: int):
+        self.worker.start()
+        http_server = ThreadingHTTPServer((host, port), create_request_handler(self))
+        print(f"BPMN server is listening on http://{host}:{port}")
+        try:
+            http_server.serve_forever()
+        finally:
+            http_server.server_close()
+
+
+def create_request_handler(server: BPMNServer):
+    """
+    Creates the HTTP request handler for the given server.
+    Endpoints:
+        POST /jobs              {"text": "...", "title": "...", "wait": false, "incremental": false}
+                                -> submit a text description, incremental jobs of a title reuse the previous results
+        GET  /jobs/<id>         -> status, latency and the BPMN syntax of the job
+        GET  /jobs/<id>/png     -> the rendered BPMN model
+        GET  /stats             -> queue length, processing statistics and the loaded models
+    """
+
+    class RequestHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("Expected a JSON object")
+                job = server.submit(body["text"], body.get("title", "bpmn_model"), bool(body.get("incremental", False)))
+            except KeyError:
+                self.send_json(400, {"error": "Expected a JSON body with the field 'text'"})
+                return
+            except (ValueError, TypeError, AttributeError) as e:
+                self.send_json(400, {"error": str(e)})
+                return
+            if body.get("wait", False):
+                job.done.wait()
+                self.send_json(200 if job.status == "finished" else 500, job.to_dict())
+            else:
+                self.send_json(202, job.to_dict())
+
+        def do_GET(self):
+            parts = [part for part in self.path.split("/") if part != ""]
+            if parts == ["stats"]:
+                self.send_json(200, server.statistics())
+                return
+            if len(parts) < 2 or parts[0] != "jobs":
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            job = server.get_job(parts[1])
+            if job is None:
+                self.send_json(404, {"error": f"Unknown job {parts[1]}"})
+            elif len(parts) == 2:
+                self.send_json(200, job.to_dict())
+            elif parts[2] == "png" and job.status == "finished":
+                with open(job.output_path, "rb") as file:
+                    image = file.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(image)))
+                self.end_headers()
+                self.wfile.write(image)
+            else:
+                self.send_json(409, {"error": f"Job {job.id} is {job.status}"})
+
+        def send_json(self, status: int, content: dict):
+            body = json.dumps(content).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return RequestHandler
+
+
+if __name__ == '__main__':
+    """
+    Runs the BPMN generation as a resident service, so that the spacy models are only loaded once.
+    """
+    parser = argparse.ArgumentParser(description="Serve the BPMN generation over HTTP")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--output", default=f"{BASE_PATH}/results/BPMN_results",
+                        help="folder where the rendered BPMN models are stored")
+    args = parser.parse_args()
+
+    nlp, nlp_similarity = BPMNStarter.load_spacy_models()
+    BPMNServer(nlp, nlp_similarity, args.output).serve(args.host, args.port)
@@ -11,8 +11,58 @@ from AnalyzeText import determine_marker, correct_order, build_flows, get_valid_
 from BPMNCreator import create_bpmn_model
 from Utilities import text_pre_processing, open_file
 from alternative_approaches.filtering_irrelevant_information import remove_introduction_sentence
-from project.Constant import LLM_ATR, remove_introduction_sentence_with_spacy
+from project.Constant import LLM_ATR, remove_introduction_sentence_with_spacy, DEBUG, PIPE_BATCH_SIZE, \
+    PIPE_N_PROCESS, parse_cache, actors_similarity, share_model_vocab
 from LLM_ATR import LLM_assisted_refinement
+from project.DocCache import parse_document, load_document, save_document
+from project.Profiler import profiler
+from project.ModelRegistry import model_registry
+from project.StreamingPipeline import stream_bpmn_fragments
+
+
+def load_spacy_models():
+    """
+    Load the spacy models and add the components that are needed for the BPMN generation.
+    Loading the models takes the most time of a single run, so they should be loaded once and then be reused.
+    The similarity model is only loaded on first use, runs without the similarity features never load it.
+    Returns:
+        nlp: spacy model with larger vocabulary, benepar, spacy_wordnet and coreferee
+        nlp_similarity: spacy model with vector similarity for similarity calculation (loaded lazily)
+    """
+    os.environ['TRANSFORMERS_NO_ADVISORY_WARNINGS'] = 'true'
+    warnings.filterwarnings('ignore')
+    model_registry.register("nlp", load_parsing_model)
+    nlp = model_registry.get("nlp")
+    nlp_similarity = model_registry.register(
+        "nlp_similarity", lambda: load_similarity_model(nlp),
+        required=actors_similarity or remove_introduction_sentence_with_spacy)
+    return nlp, nlp_similarity
+
+
+def load_parsing_model():
+    print("Start loading spacy model and adding components")
+    nlp = spacy.load('en_core_web_trf')
+    if DEBUG:
+        nlp.add_pipe('benepar', config={'model': 'benepar_en3'})
+    else:
+        nlp.add_pipe('benepar', config={'model': 'benepar_en3_large'})
+
+    nlp.add_pipe("spacy_wordnet", after='tagger')
+    nlp.add_pipe('coreferee')
+    print("Finished loading spacy model and adding components")
+    return nlp
+
+
+def load_similarity_model(nlp):
+    """
+    Args:
+        nlp: the parsing model, its vocabulary is shared with the similarity model if share_model_vocab is activated
+    Returns:
+        spacy model with vector similarity
+    """
+    if share_model_vocab:
+        return spacy.load("en_core_web_lg", vocab=nlp.vocab)
+    return spacy.load("en_core_web_lg")
 
 
 def start_task(nlp, nlp_similarity, input_path, title, output_path):
@@ -26,22 +76,163 @@ def start_task(nlp, nlp_similarity, input_path, title, output_path):
         output_path: output path for the BPMN model, containing the file name and file type (.png)
         debug: boolean value to determine if the debug mode should be activated
     Returns:
-        None
+        the syntax of the generated BPMN model
     """
     text_input = open_file(input_path)
-    if LLM_ATR: text_input = LLM_assisted_refinement(text_input, nlp, title)
-    text_input = text_pre_processing(text_input)
-
-    document = nlp(text_input)
-    if remove_introduction_sentence_with_spacy: document = remove_introduction_sentence(document, nlp_similarity, nlp)
-    containerList = analyze_document(document)
-    for container in containerList:
-        determine_marker(container, nlp)
-    correct_order(containerList)
-    remove_redundant_processes(containerList)
-    # valid_actors = get_valid_actors(containerList)
-    valid_actors = get_valid_actors(containerList, nlp_similarity)
-    valid_actors = adjust_actor_list(valid_actors)
-    flows = build_flows(containerList)
-    determine_end_activities(flows, text_input)
-    create_bpmn_model(flows, valid_actors, title, output_path, text_input)
+    return start_task_from_text(nlp, nlp_similarity, text_input, title, output_path)
+
+
+def start_task_from_text(nlp, nlp_similarity, text_input, title, output_path, refine: bool = LLM_ATR):
+    """
+    Generates a BPMN model from a text description that is already loaded into memory.
+    Args:
+        nlp: spacy model with larger vocabulary
+        nlp_similarity: spacy model with vector similarity for similarity calculation
+        text_input: the textual process description
+        title: title of the BPMN model
+        output_path: output path for the BPMN model, containing the file name and file type (.png)
+        refine: if True, the text is refined with the LLM-assisted text refinement first
+    Returns:
+        the syntax of the generated BPMN model
+    """
+    text_input = prepare_text(nlp, text_input, title, refine)
+    with profiler.stage("parsing", title):
+        document = parse_document(nlp, text_input)
+    return build_bpmn_model(document, nlp, nlp_similarity, text_input, title, output_path)
+
+
+def start_streaming_task(nlp, nlp_similarity, input_path, title, output_path):
+    """
+    Generates the BPMN model of a text file sentence by sentence, see StreamingPipeline.stream_bpmn_fragments.
+    Args:
+        nlp: spacy model with larger vocabulary
+        nlp_similarity: spacy model with vector similarity for similarity calculation
+        input_path: path to text file
+        title: title of the BPMN model
+        output_path: output path for the BPMN model, containing the file name and file type (.png)
+    Returns:
+        generator of BPMNFragment per sentence, the last fragment contains the syntax of the generated BPMN model
+    """
+    return stream_bpmn_fragments(nlp, nlp_similarity, open_file(input_path), title, output_path)
+
+
+def start_tasks(nlp, nlp_similarity, tasks, batch_size: int = PIPE_BATCH_SIZE, n_process: int = PIPE_N_PROCESS):
+    """
+    Generates the BPMN models for multiple text files. The texts are parsed in batches with nlp.pipe, so that the
+    spacy model can process them together, and each parsed document is passed on to the following steps as soon as
+    its batch is available. An error only fails its own text: if a batch can not be parsed, its texts are parsed again
+    one at a time.
+    Args:
+        nlp: spacy model with larger vocabulary
+        nlp_similarity: spacy model with vector similarity for similarity calculation
+        tasks: iterable of (input_path, title, output_path) per text
+        batch_size: number of texts that are parsed together
+        n_process: number of processes that are used for parsing, only 1 is supported: the documents are pickled to
+            be sent back from the worker processes, which fails for the extension attributes of spacy_wordnet and
+            coreferee
+    Returns:
+        generator of (title, syntax of the generated BPMN model, error) per text, syntax is None if an error occurred
+    """
+    if n_process != 1:
+        print(f"Parsing with {n_process} processes is not supported, the texts are parsed in a single process")
+
+    def prepare_task(input_path, title, output_path):
+        try:
+            text_input = prepare_text(nlp, open_file(input_path), title)
+            with profiler.stage("parsing", title):
+                document = load_document(nlp, text_input) if parse_cache else None
+        except Exception as e:
+            return title, output_path, None, None, e
+        return title, output_path, text_input, document, None
+
+    def process_batch(batch):
+        # texts that failed during preparation or were loaded from the parse cache bypass nlp.pipe
+        texts = [text_input for _, _, text_input, document, error in batch if document is None and error is None]
+        with profiler.stage("parsing") as stage:
+            stage["document"] = ", ".join(title for title, _, _, _, _ in batch)
+            try:
+                documents = iter(list(nlp.pipe(texts, batch_size=batch_size)))
+            except Exception as e:
+                print(f"Could not parse the batch, parsing its texts one at a time: {e}")
+                documents = None
+        for title, output_path, text_input, document, error in batch:
+            if document is None and error is None:
+                if documents is not None:
+                    document = next(documents)
+                else:
+                    with profiler.stage("parsing", title):
+                        try:
+                            document = nlp(text_input)
+                        except Exception as e:
+                            error = e
+                if document is not None and parse_cache: save_document(nlp, text_input, document)
+            yield (title, None, error) if error is not None else process_document(document, title, output_path)
+
+    def process_document(document, title, output_path):
+        try:
+            return title, build_bpmn_model(document, nlp, nlp_similarity, document.text, title, output_path), None
+        except Exception as e:
+            return title, None, e
+
+    batch = []
+    for task in tasks:
+        batch.append(prepare_task(*task))
+        if len(batch) >= batch_size:
+            yield from process_batch(batch)
+            batch = []
+    yield from process_batch(batch)
+
+
+def prepare_text(nlp, text_input: str, title: str, refine: bool = LLM_ATR) -> str:
+    """
+    Prepares the text description for parsing: LLM-assisted refinement (if activated) and pre-processing.
+    Args:
+        nlp: spacy model with larger vocabulary
+        text_input: the textual process description
+        title: title of the BPMN model
+        refine: if True, the text is refined with the LLM-assisted text refinement
+    Returns:
+        the prepared text
+    """
+    if refine:
+        with profiler.stage("refinement", title):
+            text_input = LLM_assisted_refinement(text_input, nlp, title)
+    with profiler.stage("pre_processing", title):
+        return text_pre_processing(text_input)
+
+
+def build_bpmn_model(document, nlp, nlp_similarity, text_input: str, title: str, output_path: str) -> str:
+    """
+    Generates the BPMN model from the parsed text description.
+    Args:
+        document: the parsed text description (spacy Doc)
+        nlp: spacy model with larger vocabulary
+        nlp_similarity: spacy model with vector similarity for similarity calculation
+        text_input: the prepared text description
+        title: title of the BPMN model
+        output_path: output path for the BPMN model, containing the file name and file type (.png)
+    Returns:
+        the syntax of the generated BPMN model
+    """
+    with profiler.stage("bpmn_generation", title):
+        if remove_introduction_sentence_with_spacy:
+            with profiler.stage("remove_introduction_sentence", title):
+                document = remove_introduction_sentence(document, nlp_similarity, nlp)
+        with profiler.stage("analyze_document", title):
+            containerList = analyze_document(document)
+        with profiler.stage("determine_marker", title):
+            for container in containerList:
+                determine_marker(container, nlp)
+        with profiler.stage("correct_order", title):
+            correct_order(containerList)
+            remove_redundant_processes(containerList)
+        with profiler.stage("get_valid_actors", title):
+            # valid_actors = get_valid_actors(containerList)
+            valid_actors = get_valid_actors(containerList, nlp_similarity)
+            valid_actors = adjust_actor_list(valid_actors)
+        with profiler.stage("build_flows", title):
+            flows = build_flows(containerList)
+        with profiler.stage("determine_end_activities", title):
+            determine_end_activities(flows, text_input)
+        with profiler.stage("create_bpmn_model", title):
+            return create_bpmn_model(flows, valid_actors, title, output_path, text_input)
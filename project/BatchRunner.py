@@ -0,0 +1,156 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+import BPMNStarter
+from project.Constant import BASE_PATH, profiling
+from project.Profiler import profiler
+from project.ModelRegistry import model_registry
+
+worker_models = None  # (nlp, nlp_similarity) of the worker process, loaded once per worker
+
+
+def initialize_worker():
+    """
+    Initializer of the worker processes: loads the spacy models once, they are reused for all documents of the worker.
+    """
+    global worker_models
+    worker_models = BPMNStarter.load_spacy_models()
+
+
+def process_document(input_path: str, title: str, output_path: str) -> dict:
+    """
+    Generate the BPMN model for a single document in a worker process.
+    Args:
+        input_path: path to the text file
+        title: title of the BPMN model
+        output_path: output path for the BPMN model (.png)
+    Returns:
+        the result of the document, containing the status, the duration and the error if one occurred
+    """
+    nlp, nlp_similarity = worker_models
+    result = {"title": title, "input_path": input_path, "output_path": output_path, "worker": os.getpid()}
+    start = time.perf_counter()
+    try:
+        BPMNStarter.start_task(nlp, nlp_similarity, input_path, title, output_path)
+        result["status"] = "finished"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        result["traceback"] = traceback.format_exc()
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    if profiling: result["profile"] = profiler.save(f"batch_worker_{os.getpid()}")
+    return result
+
+
+def collect_documents(input_path: str, output_folder: str) -> [(str, str, str)]:
+    """
+    Collect the documents to be processed.
+    Args:
+        input_path: a directory containing .txt files or a manifest file with one path to a text file per line
+        output_folder: the folder where the BPMN models are stored
+    Returns:
+        list of (input path, title, output path) per document
+    """
+    if os.path.isdir(input_path):
+        paths = [os.path.join(input_path, name) for name in sorted(os.listdir(input_path)) if name.endswith(".txt")]
+    else:
+        manifest_folder = os.path.dirname(os.path.abspath(input_path))
+        with open(input_path, "r") as file:
+            paths = [line.strip() for line in file if line.strip() != "" and not line.startswith("#")]
+        paths = [path if os.path.isabs(path) else os.path.join(manifest_folder, path) for path in paths]
+
+    documents = []
+    for path in paths:
+        title = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")  # Title has to be without spaces
+        documents.append((path, title, f"{output_folder}/{title}.png"))
+    return documents
+
+
+def run_batch(documents: [(str, str, str)], workers: int, fork_after_load: bool = False,
+              report_path: Optional[str] = None) -> [dict]:
+    """
+    Fan the documents out across a process pool. A document whose worker dies (e.g. out of memory) is recorded as
+    failed, the other documents are still reported.
+    Args:
+        documents: list of (input path, title, output path) per document
+        workers: number of worker processes
+        fork_after_load: if True, the models are loaded once in the main process and the workers are forked from it,
+            otherwise every worker loads the models in its initializer
+        report_path: if not None, the report of the finished documents is written after every document
+    Returns:
+        the results of the documents in the order of completion
+    """
+    if fork_after_load:
+        initialize_worker()
+        model_registry.preload()  # the lazily loaded models that are needed, so that the workers inherit them
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker)
+
+    results = []
+    start = time.perf_counter()
+    with executor:
+        futures = {executor.submit(process_document, *document): document for document in documents}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:  # the worker process died, e.g. BrokenProcessPool
+                input_path, title, output_path = futures[future]
+                result = {"title": title, "input_path": input_path, "output_path": output_path, "worker": None,
+                          "status": "failed", "error": f"{type(e).__name__}: {e}", "seconds": 0.0}
+            results.append(result)
+            if report_path is not None:
+                write_report(report_path, results, time.perf_counter() - start)
+            print(f"[{len(results)}/{len(documents)}] {result['title']}: {result['status']} in {result['seconds']}s"
+                  + (f" ({result['error']})" if result["status"] == "failed" else ""))
+    return results
+
+
+def write_report(report_path: str, results: [dict], seconds: float):
+    with open(report_path, "w") as file:
+        json.dump({"summary": summarize(results, seconds), "results": results}, file, indent=2)
+
+
+def summarize(results: [dict], seconds: float) -> dict:
+    finished = [result for result in results if result["status"] == "finished"]
+    return {
+        "documents": len(results),
+        "finished": len(finished),
+        "failed": len(results) - len(finished),
+        "wall_seconds": round(seconds, 2),
+        "documents_per_minute": round(len(results) / seconds * 60, 2) if seconds > 0 else 0.0,
+        "avg_seconds_per_document": round(sum(result["seconds"] for result in results) / len(results), 2)
+        if len(results) > 0 else 0.0,
+    }
+
+
+if __name__ == '__main__':
+    """
+    Generate the BPMN models for a whole corpus of text descriptions with a pool of worker processes.
+    """
+    parser = argparse.ArgumentParser(description="Generate BPMN models for a directory or manifest of texts")
+    parser.add_argument("input", help="directory with .txt files or manifest file with one path per line")
+    parser.add_argument("--output", default=f"{BASE_PATH}/results/BPMN_results",
+                        help="folder where the BPMN models are stored")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--fork-after-load", action="store_true",
+                        help="load the models once in the main process and fork the workers from it")
+    parser.add_argument("--report", default=None, help="path of the JSON report, default: <output>/batch_report.json")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    documents = collect_documents(args.input, args.output)
+    print(f"Start generating {len(documents)} models with {args.workers} workers")
+    report_path = args.report if args.report is not None else f"{args.output}/batch_report.json"
+    start = time.perf_counter()
+    results = run_batch(documents, args.workers, args.fork_after_load, report_path)
+    seconds = time.perf_counter() - start
+    print(f"Summary: {summarize(results, seconds)}")
+    write_report(report_path, results, seconds)
+    print(f"Report: {report_path}")
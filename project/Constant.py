@@ -1,3 +1,5 @@
+import os
+
 BASE_PATH = "/Users/vincentderekheld/PycharmProjects/text2BPMN-vincent"
 
 DEBUG = False  # Default: False;  True: use small model, False: use large model
@@ -22,10 +24,60 @@ less_end_gateways2 = True # Default: True; Use less end gateways
 filter_irrelevant_information = True  # Default: True; Filter irrelevant information from the input text using the LLM, therefore LLM_ATR must be True
 transform_implicit_actions = True  # Default: True; Transform implicit actions into explicit actions using the LLM, therefore LLM_ATR must be True
 resolve_enumeration = True  # Default: True; Resolve enumerations using the LLM, therefore LLM_ATR must be True
+LLM_ATR_concurrent = True  # Default: True; Refine the sentences concurrently, the order of the sentences is preserved
+LLM_ATR_MAX_WORKERS = 8  # Default: 8; Maximum number of sentences that are refined at the same time
+LLM_ATR_fused_filter = False  # Default: False; Apply all filter criteria in one request per sentence instead of one request per criterion
+LLM_ATR_batching = False  # Default: False; Send multiple numbered sentences in one request per refinement prompt
+LLM_ATR_BATCH_SIZE = 8  # Default: 8; Number of sentences per request if LLM_ATR_batching is True
+LLM_MAX_REQUESTS_PER_MINUTE = 500  # Default: 500; Rate limit shared by all LLM requests, 0 deactivates the limit
 
 filter_example_sentences_regex = False  # Default: False; Filter example sentences from the input text using the regular expression
 remove_introduction_sentence_with_spacy = False  # Default: False; Remove introduction sentences from the input text using the spacy_similarity
 
+LLM_cache = True  # Default: True; Cache the LLM responses on disk, identical prompts are only sent once
+LLM_replay_only = False  # Default: False; True: only use cached LLM responses and fail fast if a response is not cached
+LLM_CACHE_PATH = f"{BASE_PATH}/results/LLM_cache/responses.sqlite"
+LLM_CACHE_MAX_ENTRIES = 50000  # Default: 50000; least recently used responses are evicted beyond this size
+LLM_BACKEND = "openai"  # Default: "openai"; "openai": send the requests to the API, "replay": replay the recorded responses of LLM_RECORDING_PATH, "local": use the local model
+LLM_STAGE_BACKENDS = {}  # Default: {}; Backend per LLM-assisted stage ("refinement", "task_labels", "real_actor", "end_activity"), e.g. {"real_actor": "local", "end_activity": "local"}
+LOCAL_LLM_MODEL = "qwen2.5-1.5b-instruct"  # Name of the local instruct model, sent to the local server and part of the cache key
+LOCAL_LLM_URL = os.environ.get("LOCAL_LLM_URL", "http://127.0.0.1:8080/v1")  # OpenAI compatible local server (llama.cpp server, Ollama)
+LOCAL_LLM_PATH = None  # Default: None; Path to a quantized GGUF model to load in-process with llama-cpp-python instead of LOCAL_LLM_URL
+LOCAL_LLM_CONTEXT = 8192  # Default: 8192; Context size of the in-process local model
+LLM_record = False  # Default: False; True: the "replay" backend sends requests without recorded response to the API and records them
+LLM_RECORDING_PATH = f"{BASE_PATH}/results/LLM_recordings/responses.jsonl"
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")  # Point to a local stub server for tests
+LLM_CONNECT_TIMEOUT = 10  # Default: 10; Seconds to establish the connection to the LLM API
+LLM_READ_TIMEOUT = 120  # Default: 120; Seconds to wait for the response of the LLM API
+LLM_MAX_RETRIES = 4  # Default: 4; Retries on rate limit (429), server (5xx) and connection errors
+LLM_BACKOFF_SECONDS = 1.0  # Default: 1.0; Base of the exponential backoff with jitter between the retries
+LLM_BACKOFF_MAX_SECONDS = 30.0  # Default: 30.0; Upper bound of the backoff between the retries
+
+parse_cache = True  # Default: True; Cache the parsed documents on disk, identical texts are only parsed once per pipeline version
+PARSE_CACHE_PATH = f"{BASE_PATH}/results/parse_cache"
+
+HYPERNYM_CACHE_SIZE = 20000  # Default: 20000; Number of synsets whose hypernym chain is kept in memory (WordNetWrapper)
+ACTOR_LEXICON_PATH = f"{BASE_PATH}/results/actor_lexicon.json"  # Real-actor verdicts of the LLM, reused across texts (ActorClassifier.py)
+HYPERNYM_TABLE_PATH = f"{BASE_PATH}/results/wordnet/hypernyms.json"  # Optional precomputed hypernym chains, used if the file exists
+
+pipeline_profiles = True  # Default: True; Run only the spacy components whose annotations a stage needs (PipelineProfiles.py), e.g. no constituency parsing and coreference for the refinement
+share_model_vocab = False  # Default: False; True: the similarity model (en_core_web_lg) is loaded into the vocabulary of the parsing model, so strings and vectors are only stored once
+
+PIPE_BATCH_SIZE = 8  # Default: 8; Number of texts that are parsed together by nlp.pipe (BPMNStarter.start_tasks)
+STREAM_WINDOW_SENTENCES = 2  # Default: 2; Look-back window of the streaming pipeline (StreamingPipeline.py): previous sentences parsed with a sentence for coreferences, and sentences after which a structure is emitted
+
+PIPE_N_PROCESS = 1  # Default: 1; Number of processes that nlp.pipe uses for parsing (BPMNStarter.start_tasks), only 1 is supported, the extension attributes of spacy_wordnet and coreferee can not be sent back from worker processes
+
+profiling = False  # Default: False; Record wall time, CPU time, peak memory and LLM calls per stage and document (Profiler.py)
+profiling_tracemalloc = False  # Default: False; Also record the peak of the Python heap per stage with tracemalloc, slows down the stages and misses the memory of torch
+PROFILE_PATH = f"{BASE_PATH}/results/profiles"  # JSON report and Chrome trace of the profiler
+
+SERVER_HOST = "127.0.0.1"  # Default: "127.0.0.1"; Host of the resident BPMN server (BPMNServer.py)
+SERVER_PORT = 8765  # Default: 8765; Port of the resident BPMN server (BPMNServer.py)
+SERVER_JOB_TTL_SECONDS = 3600  # Default: 3600; Finished jobs of the server are dropped after this time
+SERVER_MAX_JOBS = 1000  # Default: 1000; Finished jobs of the server beyond this number are dropped, oldest first
+SERVER_MAX_SESSIONS = 16  # Default: 16; Incremental sessions (one per title) that the server keeps, the least recently used one is dropped beyond this number
+
 NOT_END_ACTIVITY_VERBS = ["withdraws consent", "objects to the processing", "base the processing"]
 
 MODAL_VERBS = ["can", "could", "may", "might", "must", "shall", "should", "will", "would"]
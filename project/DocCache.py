@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+import spacy
+import srsly
+from spacy.tokens import Doc, DocBin
+
+from project.Constant import parse_cache, PARSE_CACHE_PATH
+
+# Extension attributes that are not needed after parsing and would blow up the cache (transformer output) or can not be
+# pickled (the Wordnet objects of spacy_wordnet hold their token, they are recreated by the component after loading)
+EXCLUDED_EXTENSIONS = ["trf_data", "wordnet"]
+
+# Components that are run again on a loaded document, because their extension attributes are not cached
+RECREATED_COMPONENTS = ["spacy_wordnet"]
+
+
+def get_pipeline_fingerprint(nlp) -> str:
+    """
+    The fingerprint identifies the pipeline version: spacy version, model name and version, the components that are
+    run and their configuration (e.g. the benepar model). A cached document is only reused by the same pipeline version,
+    a pipeline that disables components per call (PipelineProfiles.ProfiledPipeline) has its own fingerprint.
+    Args:
+        nlp: the spacy model
+    Returns:
+        the fingerprint of the pipeline
+    """
+    disabled = getattr(nlp, "disabled", [])
+    content = json.dumps({
+        "spacy": spacy.__version__,
+        "model": f"{nlp.meta.get('name')}-{nlp.meta.get('version')}",
+        "components": [name for name in nlp.pipe_names if name not in disabled],
+        "config": nlp.config.to_str(),
+    }, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_cache_path(nlp, text: str) -> str:
+    key = hashlib.sha256((get_pipeline_fingerprint(nlp) + text).encode("utf-8")).hexdigest()
+    return f"{PARSE_CACHE_PATH}/{key}.spacy"
+
+
+def load_document(nlp, text: str) -> Optional[Doc]:
+    """
+    Load the parsed document from the cache.
+    Args:
+        nlp: the spacy model that parsed the document
+        text: the text of the document
+    Returns:
+        the parsed document including the extension attributes (benepar constituents, coreferee chains), None if the
+        text has not been cached for this pipeline version
+    """
+    path = get_cache_path(nlp, text)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as file:
+            data = srsly.pickle_loads(file.read())
+        doc = list(DocBin().from_bytes(data["doc_bin"]).get_docs(nlp.vocab))[0]
+        doc.user_data.update(srsly.pickle_loads(data["user_data"]))
+        disabled = getattr(nlp, "disabled", [])
+        for name in RECREATED_COMPONENTS:
+            if name in nlp.pipe_names and name not in disabled:
+                doc = nlp.get_pipe(name)(doc)
+        return doc
+    except Exception as e:
+        print(f"Could not load cached document {path}: {e}")
+        return None
+
+
+def save_document(nlp, text: str, doc: Doc):
+    """
+    Store the parsed document in the cache. The annotations are serialized as DocBin, the extension attributes of
+    benepar and coreferee are pickled, as they are not supported by the DocBin serialization.
+    Args:
+        nlp: the spacy model that parsed the document
+        text: the text of the document
+        doc: the parsed document
+    """
+    user_data = {key: value for key, value in doc.user_data.items()
+                 if not (isinstance(key, tuple) and len(key) > 1 and key[1] in EXCLUDED_EXTENSIONS)}
+    try:
+        doc_bin = DocBin(store_user_data=False)
+        doc_bin.add(doc)
+        data = srsly.pickle_dumps({"doc_bin": doc_bin.to_bytes(), "user_data": srsly.pickle_dumps(user_data)})
+    except Exception as e:
+        print(f"Could not cache document: {e}")
+        return
+    os.makedirs(PARSE_CACHE_PATH, exist_ok=True)
+    with open(get_cache_path(nlp, text), "wb") as file:
+        file.write(data)
+
+
+def parse_document(nlp, text: str) -> Doc:
+    """
+    Parse the text, or reload the parsed document from the cache if the same text has already been parsed by the
+    same pipeline version.
+    Args:
+        nlp: the spacy model
+        text: the text to be parsed
+    Returns:
+        the parsed document
+    """
+    if not parse_cache:
+        return nlp(text)
+    doc = load_document(nlp, text)
+    if doc is None:
+        doc = nlp(text)
+        save_document(nlp, text, doc)
+    return doc
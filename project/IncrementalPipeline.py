@@ -0,0 +1,137 @@
+import difflib
+import time
+
+from ActorClassifier import actor_classifier
+from AnalyzeText import build_flows, get_valid_actors, adjust_actor_list, determine_end_activities
+from BPMNCreator import create_bpmn_model
+from LLM_ATR import LLMAssistedRefinement
+from Model.SentenceContainer import SentenceContainer
+from project.Constant import LLM_ATR, STREAM_WINDOW_SENTENCES
+from project.PipelineProfiles import get_pipeline
+from project.Profiler import profiler
+from project.StreamingPipeline import split_sentences, extract_containers
+from project.Utilities import text_pre_processing
+
+
+class SentenceResult:
+    """
+    The containers of a refined sentence. They are reused as long as the sentence and the previous sentences of the
+    look-back window (which are parsed with it for the coreferences) are unchanged.
+    """
+
+    def __init__(self, containers: [SentenceContainer]):
+        self.containers = containers
+        # get_valid_actors renames similar actors, the names are restored before the actors are compared again
+        self.actor_names = [(process.actor, process.actor.full_name) for container in containers
+                            for process in container.processes if process.actor is not None]
+
+    def restore_actor_names(self):
+        for actor, full_name in self.actor_names:
+            actor.full_name = full_name
+
+
+class IncrementalSession:
+    """
+    Regenerates the BPMN model of a text that is edited step by step. The text is compared sentence by sentence with
+    the text of the previous run: the refined sentences, the containers of the sentences and the end activity decisions
+    of the LLM are reused, only the changed sentences are refined and only the changed sentences and the sentences
+    whose look-back window contains a change are parsed and analyzed again (see StreamingPipeline.extract_containers).
+    The structures and the syntax are built from the containers of all sentences.
+    """
+
+    def __init__(self, nlp, nlp_similarity, window: int = STREAM_WINDOW_SENTENCES, refine: bool = LLM_ATR):
+        """
+        Args:
+            nlp: spacy model with larger vocabulary
+            nlp_similarity: spacy model with vector similarity for similarity calculation
+            window: number of previous sentences that are parsed with a sentence
+            refine: if True, the sentences are refined with the LLM-assisted text refinement
+        """
+        self.nlp = nlp
+        self.nlp_similarity = nlp_similarity
+        self.window = window
+        self.refine = refine
+        self.splitter = get_pipeline(nlp, "refinement")
+        self.refinement = LLMAssistedRefinement(nlp) if refine else None
+        self.sentences: [str] = []  # sentences of the previous run
+        self.split_cache: dict = {}  # chunk -> sentences of the previous run, see StreamingPipeline.split_sentences
+        self.refined_sentences: {str: str} = {}  # sentence -> refined sentence
+        self.results: {tuple: [SentenceResult]} = {}  # (look-back window, refined sentence) -> results
+        self.end_activity_decisions: {tuple: bool} = {}  # (refined sentence, activity) -> decision of the LLM
+        self.statistics: dict = {}
+
+    def update(self, text_input: str, title: str, output_path: str) -> str:
+        """
+        Generate the BPMN model of the edited text.
+        Args:
+            text_input: the complete edited text description
+            title: title of the BPMN model
+            output_path: output path for the BPMN model, containing the file name and file type (.png)
+        Returns:
+            the syntax of the generated BPMN model
+        """
+        start = time.perf_counter()
+        with profiler.stage("incremental_update", title):
+            split_cache = {}
+            sentences = list(split_sentences(self.splitter, text_input, self.refine, self.split_cache, split_cache))
+            self.split_cache = split_cache
+            changed = [sentences[j] for tag, _, _, j1, j2 in
+                       difflib.SequenceMatcher(None, self.sentences, sentences, autojunk=False).get_opcodes()
+                       if tag in ["replace", "insert"] for j in range(j1, j2)]
+
+            with profiler.stage("refinement", title):
+                unrefined = list(dict.fromkeys(sentence for sentence in changed
+                                               if sentence not in self.refined_sentences))
+                if self.refine and len(unrefined) > 0:
+                    refined = self.refinement.refine_sentences(unrefined)
+                else:
+                    refined = unrefined
+                self.refined_sentences.update(zip(unrefined, refined))
+                self.refined_sentences = {sentence: self.refined_sentences[sentence] for sentence in sentences}
+                refined_sentences = [text_pre_processing(self.refined_sentences[sentence]).strip()
+                                     for sentence in sentences]
+                refined_sentences = [sentence for sentence in refined_sentences if len(sentence) > 0]
+
+            with profiler.stage("analyze_document", title):
+                results = {}
+                ordered = []
+                analyzed = 0
+                for i, sentence in enumerate(refined_sentences):
+                    key = (tuple(refined_sentences[max(0, i - self.window):i]), sentence)
+                    previous = self.results.get(key, [])
+                    if len(previous) > 0:
+                        result = previous.pop(0)
+                        result.restore_actor_names()
+                    else:
+                        result = SentenceResult(extract_containers(self.nlp, list(key[0]), sentence))
+                        analyzed += 1
+                    results.setdefault(key, []).append(result)
+                    ordered.append(result)
+                self.results = results
+                actor_classifier.resolve_pending()  # one LLM request for the actors of all analyzed sentences
+            self.sentences = sentences
+
+            container_list = [container for result in ordered for container in result.containers]
+            text = " ".join(refined_sentences)
+            # same order as BPMNStarter.build_bpmn_model: the gateways compare the merged actor names
+            with profiler.stage("get_valid_actors", title):
+                valid_actors = adjust_actor_list(get_valid_actors(container_list, self.nlp_similarity))
+            with profiler.stage("build_flows", title):
+                flows = build_flows(container_list)
+            with profiler.stage("determine_end_activities", title):
+                current_sentences = set(refined_sentences)
+                self.end_activity_decisions = {key: decision for key, decision in self.end_activity_decisions.items()
+                                               if key[0] in current_sentences}
+                determine_end_activities(flows, text, self.end_activity_decisions)
+            with profiler.stage("create_bpmn_model", title):
+                syntax = create_bpmn_model(flows, valid_actors, title, output_path, text)
+
+        self.statistics = {
+            "sentences": len(sentences),
+            "changed_sentences": len(changed),
+            "refined_sentences": len(unrefined) if self.refine else 0,
+            "analyzed_sentences": analyzed,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        print(f"Incremental update of {title}: {self.statistics}")
+        return syntax
@@ -0,0 +1,68 @@
+from spacy.matcher import Matcher
+from spacy.tokens import Span
+from spacy.vocab import Vocab
+
+from project.Constant import COMPOUND_CONDITIONAL_INDICATORS, COMPOUND_PARALLEL_INDICATORS, \
+    COMPOUND_SEQUENCE_INDICATORS, CASE_INDICATORS
+
+# All compound indicator rules of Constant.py, grouped by the marker category they indicate
+INDICATOR_RULES = {
+    "COMPOUND_CONDITIONAL": COMPOUND_CONDITIONAL_INDICATORS,
+    "COMPOUND_PARALLEL": COMPOUND_PARALLEL_INDICATORS,
+    "COMPOUND_SEQUENCE": COMPOUND_SEQUENCE_INDICATORS,
+    "CASE": CASE_INDICATORS,
+}
+
+matchers = {}
+
+
+def get_indicator_matcher(vocab: Vocab) -> Matcher:
+    """
+    Returns:
+        a single matcher that contains the rules of all indicator categories, it is compiled once per vocabulary
+    """
+    if id(vocab) not in matchers:
+        matcher = Matcher(vocab)
+        for category, rules in INDICATOR_RULES.items():
+            for rule in rules:
+                for k, v in rule.items():
+                    matcher.add(f"{category}:{k}", [v])
+        matchers[id(vocab)] = matcher
+    return matchers[id(vocab)]
+
+
+def find_indicator_matches(sentence: Span) -> [(str, int, int)]:
+    """
+    Find all indicators in the sentence with one pass of the shared matcher.
+    Args:
+        sentence: the sentence to be searched
+    Returns:
+        list of (category, start, end) per match, start and end are token indices in the document
+    """
+    matcher = get_indicator_matcher(sentence.doc.vocab)
+    result = []
+    for match_id, start, end in matcher(sentence):
+        category = sentence.doc.vocab.strings[match_id].split(":")[0]
+        result.append((category, sentence.start + start, sentence.start + end))
+    return result
+
+
+def get_indicator_spans(matches: [(str, int, int)], category: str, sub_sentence: Span) -> [Span]:
+    """
+    Args:
+        matches: the matches of the sentence, see find_indicator_matches
+        category: the indicator category, a key of INDICATOR_RULES
+        sub_sentence: the part of the sentence the matches must lie in
+    Returns:
+        the matched spans of the category that lie completely within the sub-sentence
+    """
+    return [sub_sentence.doc[start:end] for match_category, start, end in matches
+            if match_category == category and sub_sentence.start <= start and end <= sub_sentence.end]
+
+
+def contains_indicator_match(matches: [(str, int, int)], category: str, sub_sentence: Span) -> bool:
+    """
+    Returns:
+        True if the sub-sentence contains an indicator of the category, False otherwise
+    """
+    return len(get_indicator_spans(matches, category, sub_sentence)) > 0
@@ -1,39 +1,467 @@
+import email.utils
+import json
 import logging
 import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Optional
 
 import openai
 from openai import OpenAI
 import requests
+from requests.adapters import HTTPAdapter
 
+from project.Constant import LLM_cache, LLM_replay_only, LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, \
+    LLM_MAX_REQUESTS_PER_MINUTE, OPENAI_BASE_URL, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_MAX_RETRIES, \
+    LLM_BACKOFF_SECONDS, LLM_BACKOFF_MAX_SECONDS, LLM_ATR_MAX_WORKERS, LLM_BACKEND, LLM_RECORDING_PATH, LLM_record, \
+    LLM_STAGE_BACKENDS, LOCAL_LLM_MODEL, LOCAL_LLM_URL, LOCAL_LLM_PATH, LOCAL_LLM_CONTEXT
+from project.LLM_Cache import LLMResponseCache, LLMCacheMissError
 
-def generate_response_GPT3_instruct_model(prompt: str) -> str:
+response_cache = None
+
+
+class RateLimiter:
+    """
+    Spaces the LLM requests of all threads evenly, so that at most max_requests_per_minute requests are sent.
+    """
+
+    def __init__(self, max_requests_per_minute: int):
+        self.interval = 60.0 / max_requests_per_minute if max_requests_per_minute > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.interval == 0.0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+rate_limiter = RateLimiter(LLM_MAX_REQUESTS_PER_MINUTE)
+
+logging.getLogger('openai').setLevel(logging.ERROR)
+logging.getLogger('urllib3').setLevel(logging.ERROR)
+logging.getLogger('httpx').setLevel(logging.ERROR)
+
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+http_session = None
+openai_client = None
+client_lock = threading.Lock()
+
+llm_metrics = {}
+metrics_lock = threading.Lock()
+
+
+class RetryableLLMError(RuntimeError):
+    """Raised for responses that are worth retrying (rate limit or server error)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+RETRYABLE_EXCEPTIONS = (RetryableLLMError, requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                        openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns:
+        the shared HTTP session, its connection pool keeps the connections to the API alive between the requests
+    """
+    global http_session
+    with client_lock:
+        if http_session is None:
+            http_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(LLM_ATR_MAX_WORKERS, 10))
+            http_session.mount("https://", adapter)
+            http_session.mount("http://", adapter)
+    return http_session
+
+
+def get_openai_client() -> OpenAI:
+    """
+    Returns:
+        the shared OpenAI client, retries are handled by send_with_retry
+    """
+    global openai_client
+    with client_lock:
+        if openai_client is None:
+            openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"], base_url=OPENAI_BASE_URL,
+                                   timeout=LLM_READ_TIMEOUT, max_retries=0)
+    return openai_client
+
+
+def post_to_api(endpoint: str, data: dict, base_url: str = OPENAI_BASE_URL) -> dict:
+    """
+    Send a POST request to the API with the shared HTTP session.
+    Args:
+        endpoint: the endpoint relative to the base url, e.g. "completions"
+        data: the JSON payload of the request
+        base_url: the base url of the API, the OpenAI API key is only sent to OPENAI_BASE_URL
+    Returns:
+        the JSON response
+    Raises:
+        RetryableLLMError: if the API answers with a rate limit or server error
+    """
+    headers = {'Content-Type': 'application/json'}
+    if base_url == OPENAI_BASE_URL:
+        headers['Authorization'] = f'Bearer {os.environ["OPENAI_API_KEY"]}'
+    response = get_http_session().post(f"{base_url}/{endpoint}", headers=headers, json=data,
+                                       timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT))
+    if response.status_code in RETRY_STATUS_CODES:
+        raise RetryableLLMError(f"API responded with status {response.status_code}",
+                                parse_retry_after(response.headers.get("Retry-After")))
+    response.raise_for_status()
+    return response.json()
+
+
+def parse_retry_after(retry_after: Optional[str]) -> Optional[float]:
+    """
+    Args:
+        retry_after: the Retry-After header, either seconds or an HTTP date
+    Returns:
+        the seconds to wait before the next attempt, None if the header is missing or can not be parsed
+    """
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+def send_with_retry(model: str, send, rate_limited: bool = True):
+    """
+    Call send and retry it with exponential backoff and jitter, if it fails with a rate limit, server or connection
+    error. The latency of every call is recorded in the LLM metrics.
+    Args:
+        model: the name of the model, used for the metrics
+        send: function without arguments that sends the request
+        rate_limited: if True, every attempt waits for the shared rate limiter first
+    Returns:
+        the result of send
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if rate_limited:
+            rate_limiter.wait()
+        start = time.perf_counter()
+        try:
+            result = send()
+            record_llm_call(model, time.perf_counter() - start, retries=attempt, tokens=get_token_usage(result))
+            return result
+        except RETRYABLE_EXCEPTIONS as e:
+            if attempt == LLM_MAX_RETRIES:
+                record_llm_call(model, time.perf_counter() - start, retries=attempt, failed=True)
+                raise
+            delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_SECONDS * 2 ** attempt))
+            if isinstance(e, RetryableLLMError) and e.retry_after is not None:
+                delay = max(delay, e.retry_after)
+            print(f"LLM request to {model} failed ({e}), retry {attempt + 1} in {delay:.1f} seconds")
+            time.sleep(delay)
+
+
+def get_token_usage(response) -> (int, int):
+    """
+    Returns:
+        the number of prompt and completion tokens of the response (JSON or OpenAI client response), (0, 0) if unknown
+    """
+    usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0
+    if isinstance(usage, dict):
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+def record_llm_call(model: str, seconds: float, retries: int = 0, failed: bool = False, tokens: (int, int) = (0, 0)):
+    with metrics_lock:
+        metrics = llm_metrics.setdefault(model, {"calls": 0, "retries": 0, "failed": 0, "total_seconds": 0.0,
+                                                 "max_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+        metrics["calls"] += 1
+        metrics["prompt_tokens"] += tokens[0]
+        metrics["completion_tokens"] += tokens[1]
+        metrics["retries"] += retries
+        metrics["failed"] += 1 if failed else 0
+        metrics["total_seconds"] += seconds
+        metrics["max_seconds"] = max(metrics["max_seconds"], seconds)
+
+
+def get_llm_metrics() -> dict:
+    """
+    Returns:
+        per model: the number of calls, retries and failed calls, the total, average and maximal latency in seconds and
+        the number of prompt and completion tokens
+    """
+    with metrics_lock:
+        result = {}
+        for model, metrics in llm_metrics.items():
+            result[model] = dict(metrics)
+            result[model]["avg_seconds"] = metrics["total_seconds"] / metrics["calls"] if metrics["calls"] > 0 else 0
+        return result
+
+
+def reset_llm_metrics():
+    with metrics_lock:
+        llm_metrics.clear()
+
+
+class LLMBackend(ABC):
+    """
+    Answers the requests of the generate_response_* functions that are not served by the LLM response cache.
+    """
+    name = ""
+
+    def get_model(self, model: str) -> str:
+        """
+        Returns:
+            the name of the model that actually answers the requests for the given model, used for the cache key
+        """
+        return model
+
+    @abstractmethod
+    def send(self, model: str, prompt: str, parameters: dict, send_request) -> str:
+        """
+        Args:
+            model: the name of the model
+            prompt: the prompt of the request
+            parameters: the parameters of the request
+            send_request: function that sends the request to the OpenAI API, called with the prompt and the parameters
+        Returns:
+            the response text
+        """
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Sends the requests to the OpenAI API (or the API at OPENAI_BASE_URL, e.g. LLM_FakeServer.py).
+    """
+    name = "openai"
+
+    def send(self, model: str, prompt: str, parameters: dict, send_request) -> str:
+        return send_request(prompt, parameters)  # every attempt waits for the rate limiter (send_with_retry)
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Replays recorded responses from a JSON lines file, one request per line with model, prompt, parameters and
+    response. In record mode, requests without a recorded response are sent with the given backend and appended to the
+    file. Unlike the LLM response cache, the recordings are never evicted and can be versioned with the tests.
+    """
+    name = "replay"
+
+    def __init__(self, path: str, record: bool = False, backend: Optional[LLMBackend] = None):
+        self.path = path
+        self.record = record
+        self.backend = backend if backend is not None else OpenAIBackend()
+        self.responses = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                for line in file:
+                    if line.strip() != "":
+                        entry = json.loads(line)
+                        key = LLMResponseCache.create_key(entry["model"], entry["prompt"], entry["parameters"])
+                        self.responses[key] = entry["response"]
+
+    def send(self, model: str, prompt: str, parameters: dict, send_request) -> str:
+        key = LLMResponseCache.create_key(model, prompt, parameters)
+        with self.lock:
+            response_text = self.responses.get(key)
+        if response_text is not None:
+            return response_text
+        if not self.record:
+            raise LLMCacheMissError(f"No recorded {model} response for prompt: {prompt[:80]}...")
+        response_text = self.backend.send(model, prompt, parameters, send_request)
+        with self.lock:
+            self.responses[key] = response_text
+            folder = os.path.dirname(self.path)
+            if folder != "":
+                os.makedirs(folder, exist_ok=True)
+            with open(self.path, "a") as file:
+                file.write(json.dumps({"model": model, "prompt": prompt, "parameters": parameters,
+                                       "response": response_text}) + "\n")
+        return response_text
+
+
+class LocalModelBackend(LLMBackend):
+    """
+    Answers the requests with a local instruct model instead of the OpenAI models, the prompts stay the same.
+    The model is either loaded once in-process with llama-cpp-python (LOCAL_LLM_PATH, a quantized GGUF file) or
+    served by a local OpenAI compatible server (LOCAL_LLM_URL, e.g. llama.cpp server or Ollama).
+    """
+    name = "local"
+
+    def __init__(self, model: str = LOCAL_LLM_MODEL, url: str = LOCAL_LLM_URL, path: Optional[str] = LOCAL_LLM_PATH):
+        self.model = model
+        self.url = url
+        self.path = path
+        self.llama = None
+        self.lock = threading.Lock()
+
+    def get_model(self, model: str) -> str:
+        return f"local/{self.model}"
+
+    def get_llama(self):
+        """
+        Returns:
+            the in-process model, loaded on first use
+        """
+        with self.lock:
+            if self.llama is None:
+                try:
+                    from llama_cpp import Llama
+                except ImportError:
+                    raise ImportError("The in-process local model requires llama-cpp-python: "
+                                      "pip install llama-cpp-python, or set LOCAL_LLM_PATH to None to use LOCAL_LLM_URL")
+                self.llama = Llama(model_path=self.path, n_ctx=LOCAL_LLM_CONTEXT, verbose=False)
+        return self.llama
+
+    def send(self, model: str, prompt: str, parameters: dict, send_request) -> str:
+        options = {"temperature": parameters.get("temperature", 0), "max_tokens": parameters.get("max_tokens", 1000)}
+        messages = [{"role": "user", "content": prompt}]
+        if self.path is not None:
+            llama = self.get_llama()
+            with self.lock:  # the in-process model answers one request at a time
+                start = time.perf_counter()
+                response = llama.create_chat_completion(messages=messages, **options)
+                record_llm_call(self.get_model(model), time.perf_counter() - start, tokens=get_token_usage(response))
+        else:
+            data = {"model": self.model, "messages": messages, **options}
+            response = send_with_retry(self.get_model(model),
+                                       lambda: post_to_api("chat/completions", data, base_url=self.url),
+                                       rate_limited=False)  # the OpenAI rate limit does not apply to the local model
+        return response["choices"][0]["message"]["content"].strip()
+
+
+backends = {}
+
+
+def get_backend(stage: Optional[str] = None) -> LLMBackend:
+    """
+    Args:
+        stage: the LLM-assisted stage of the request ("refinement", "task_labels", "real_actor", "end_activity")
+    Returns:
+        the backend that is selected for the stage with LLM_STAGE_BACKENDS, otherwise the backend of LLM_BACKEND
+    """
+    name = LLM_STAGE_BACKENDS.get(stage, LLM_BACKEND)
+    with client_lock:
+        if name not in backends:
+            if name == "openai":
+                backends[name] = OpenAIBackend()
+            elif name == "replay":
+                backends[name] = ReplayBackend(LLM_RECORDING_PATH, record=LLM_record)
+            elif name == "local":
+                backends[name] = LocalModelBackend()
+            else:
+                raise ValueError(f"Unknown LLM backend: {name}")
+        return backends[name]
+
+
+def set_backend(llm_backend: LLMBackend, name: str = LLM_BACKEND):
+    """
+    Replace the backend that is selected with the given name, e.g. with a ReplayBackend for tests and benchmarks.
+    """
+    with client_lock:
+        backends[name] = llm_backend
+
+
+def get_response_cache():
+    """
+    Returns:
+        the shared LLM response cache, None if the cache is deactivated
+    """
+    global response_cache
+    if (LLM_cache or LLM_replay_only) and response_cache is None:
+        response_cache = LLMResponseCache(LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES,
+                                          replay_only=LLM_replay_only)
+    return response_cache
+
+
+def get_llm_cache_statistics() -> dict:
+    """
+    Returns:
+        the number of cache hits, misses and entries of the LLM response cache
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return {"hits": 0, "misses": 0, "entries": 0}
+    return cache.statistics()
+
+
+def cached_request(model: str, prompt: str, parameters: dict, send_request, stage: Optional[str] = None) -> str:
+    """
+    Return the cached response for the request if available, otherwise send the request and cache the response.
+    Args:
+        model: the name of the model
+        prompt: the prompt to generate a response from
+        parameters: the parameters of the request, they are part of the cache key
+        send_request: function that sends the request to the OpenAI API, called with the prompt and the parameters
+        stage: the LLM-assisted stage of the request, it determines the backend (see get_backend)
+    Returns:
+        response_text: the (cached) response text
+    """
+    backend = get_backend(stage)
+    cache = get_response_cache()
+    if cache is None:
+        return backend.send(model, prompt, parameters, send_request)
+    response_text = cache.get(backend.get_model(model), prompt, parameters)
+    if response_text is None:
+        response_text = backend.send(model, prompt, parameters, send_request)
+        cache.put(backend.get_model(model), prompt, parameters, response_text)
+    return response_text
+
+
+def generate_response_GPT3_instruct_model(prompt: str, stage: Optional[str] = None) -> str:
     """
     Generate a response from the GPT3.5-instruct model based on the provided prompt.
     Args:
         prompt: the prompt to generate a response from
+        stage: the LLM-assisted stage of the request, it determines the backend (see get_backend)
+    Returns:
+        response_text: the generated response text
+    """
+    return cached_request("gpt-3.5-turbo-instruct", prompt, {"max_tokens": 1000, "temperature": 0},
+                          request_GPT3_instruct_model, stage)
+
+
+def request_GPT3_instruct_model(prompt: str, parameters: dict) -> str:
+    """
+    Send the prompt to the GPT3.5-instruct model.
+    Args:
+        prompt: the prompt to generate a response from
+        parameters: the parameters of the request (max_tokens, temperature)
     Returns:
         response_text: the generated response text
     """
     debug_mode = False
     try:
         if debug_mode: print(f"*** Prompt: *** len: {len(prompt).__str__()} \n {prompt} \n")
-        api_key = os.environ["OPENAI_API_KEY"]
-        # Define the headers for the HTTP request
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
         # Define the data payload for the API request
         data = {
             "model": "gpt-3.5-turbo-instruct",
             "prompt": prompt,
-            "max_tokens": 1000,
-            "temperature": 0
+            **parameters
         }
         # Make the POST request to the OpenAI API
-        response = requests.post('https://api.openai.com/v1/completions', headers=headers, json=data)
+        response_data = send_with_retry("gpt-3.5-turbo-instruct", lambda: post_to_api("completions", data))
         # Extract the response text
-        response_data = response.json()
         if response_data['choices']:
             response_text = response_data['choices'][0]['text'].strip()
             # response_text = filter_quotation_marks(response_text)
@@ -53,32 +481,41 @@ def generate_response_GPT3_instruct_model(prompt: str) -> str:
         raise RuntimeError(f"An unexpected error occurred: {e}")
 
 
-def generate_response_GPT4_model(prompt: str) -> str:
+def generate_response_GPT4_model(prompt: str, stage: Optional[str] = None) -> str:
     """
        Generate a response from the GPT4 model based on the provided prompt.
        Uses the v1/chat/completions endpoint API
        Args:
            prompt: the prompt to generate a response from
+           stage: the LLM-assisted stage of the request, it determines the backend (see get_backend)
+       Returns:
+           response_text: the generated response text
+       """
+    return cached_request("gpt-4-0613", prompt, {}, request_GPT4_model, stage)
+
+
+def request_GPT4_model(prompt: str, parameters: dict) -> str:
+    """
+       Send the prompt to the GPT4 model.
+       Args:
+           prompt: the prompt to generate a response from
+           parameters: the parameters of the request
        Returns:
            response_text: the generated response text
        """
-    try:
-        logging.getLogger('openai').setLevel(logging.ERROR)
-        logging.getLogger('urllib3').setLevel(logging.ERROR)
-    except:
-        raise Exception("Could not set logging level for openai logger")
     model_engine = "gpt-4-0613"
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    client = get_openai_client()
     os.environ["TOKENIZERS_PARALLELISM"] = "false"
     intro = ""
-    response = client.chat.completions.create(
+    response = send_with_retry(model_engine, lambda: client.chat.completions.create(
         model=model_engine,
         messages=[
             {"role": "system", "content": intro},
             {"role": "assistant", "content": ""},
             {"role": "user", "content": prompt},
-        ]
-    )
+        ],
+        **parameters
+    ))
     response_text = response.choices[0].message.content
     # response_text = filter_quotation_marks(response_text)
     response_text = response_text.strip()
@@ -93,9 +530,20 @@ def generate_response_text_davinci_003(prompt):
            Returns:
                response_text: the generated response text
            """
+    return cached_request("text-davinci-003", prompt, {"max_tokens": 1024, "temperature": 0.0},
+                          request_text_davinci_003)
+
+
+def request_text_davinci_003(prompt: str, parameters: dict) -> str:
+    """    Send the prompt to the text-davinci-003 model.
+           Args:
+               prompt: the prompt to generate a response from
+               parameters: the parameters of the request (max_tokens, temperature)
+           Returns:
+               response_text: the generated response text
+           """
     model_engine = "text-davinci-003"
-    response = openai.Completion.create(
-        engine=model_engine, prompt=prompt, max_tokens=1024, n=1, stop=None, temperature=0.0)
+    response = openai.Completion.create(engine=model_engine, prompt=prompt, n=1, stop=None, **parameters)
     response_text = response["choices"][0]["text"]
     text_response = response_text.strip()
     return text_response
@@ -103,8 +551,7 @@ def generate_response_text_davinci_003(prompt):
 
 def print_GPT_model_overview():
     """Print an overview of the available GPT models"""
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-    print(client.models.list())
+    print(get_openai_client().models.list())
 
 
 def filter_quotation_marks(text: str) -> str:
@@ -135,6 +582,44 @@ def normalize_boolean_result(result: str) -> bool:
         raise ValueError("No valid LLM response received in data: '{}'".format(result))
 
 
+def format_numbered_list(items: [str]) -> str:
+    """
+    Format the items as numbered lines ("1: item"), so that multiple items can be sent in a single request.
+    Args:
+        items: the items to be numbered
+    Returns:
+        the numbered items, one per line
+    """
+    return "\n".join(f"{number}: {item}" for number, item in enumerate(items, start=1))
+
+
+def parse_numbered_response(response: str, count: int) -> Optional[list]:
+    """
+    Parse a response that consists of numbered lines ("1: result") back into a list.
+    Args:
+        response: the response of the LLM
+        count: the number of items that were sent
+    Returns:
+        the results in the order of their numbers, None if the response can not be aligned with the items
+    """
+    results = {}
+    last_number = None
+    for line in response.splitlines():
+        match = re.match(r"^\s*(\d+)\s*[:.)]\s?(.*)$", line)
+        if match is not None:
+            last_number = int(match.group(1))
+            if last_number in results or not 1 <= last_number <= count:
+                return None
+            results[last_number] = match.group(2).strip()
+        elif line.strip() != "":
+            if last_number is None:
+                return None
+            results[last_number] = (results[last_number] + " " + line.strip()).strip()
+    if len(results) != count:
+        return None
+    return [results[number] for number in range(1, count + 1)]
+
+
 if __name__ == '__main__':
     print("Hello, World!")
     print_GPT_model_overview()
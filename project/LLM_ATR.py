@@ -1,56 +1,31 @@
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 import spacy
 from spacy.tokens import Doc
+from typing import Optional
 
 from project.Constant import DEBUG, resolve_enumeration, filter_irrelevant_information, transform_implicit_actions, \
-    filter_finish_activities, BASE_PATH
-from project.LLM_API import generate_response_GPT3_instruct_model, generate_response_GPT4_model
+    filter_finish_activities, BASE_PATH, LLM_ATR_concurrent, LLM_ATR_MAX_WORKERS, LLM_ATR_batching, \
+    LLM_ATR_BATCH_SIZE, LLM_ATR_fused_filter, pipeline_profiles
+from project.LLM_API import generate_response_GPT3_instruct_model, generate_response_GPT4_model, \
+    format_numbered_list, parse_numbered_response
+from project.PipelineProfiles import get_pipeline
 from project.Utilities import write_to_file, open_file, text_pre_processing
 
-
-def contains_listings(doc: Doc) -> bool:
-    text_contains_listings = False
-    if resolve_enumeration:
-        for token in doc:
-            if token.tag_ == "LS":
-                print(f"Found listing: {token.text}")
-                text_contains_listings = True
-                break
-    return text_contains_listings
-
-
-def LLM_assisted_refinement(text_input: str, nlp, title: str):
+OUTRO = """\n ### TEXT ### \n"""
+ANSWER_OUTRO = "\n ### Answer / Response: ###"
+BATCH_INSTRUCTION = """
+    ### Batch Instruction: ###
+    The text consists of numbered sentences in the format "<number>: <sentence>". Apply the instruction to every sentence separately.
+    Return exactly one line per sentence in the same order and in the format "<number>: <result>". 
+    If a sentence is returned as an empty message, return only its number followed by a colon.
     """
-    LLM-assisted refinement of the input text. The text refinement is based on the LLM model and includes the following steps:
-    1) Resolve enumerations
-    2) Filter irrelevant information
-    3) Transform implicit actions into explicit actions
 
-    Args:
-        text_input: the input text to be refined
-        nlp: the large spacy model
-        title: the title of the text output diagram
-    Returns:
-        result: the LLM-assisted refined text
-    """
-    print("Start LLM-assisted refinement --- this can take some time...")
-    os.environ["TOKENIZERS_PARALLELISM"] = "false"
-    debug_mode = True
-    text_input = text_pre_processing(text_input)
-    doc = nlp(text_input)  # Create doc object from input text for identification of listings and for sentence splitting
-    outro = """\n ### TEXT ### \n"""
-    answer_outro = "\n ### Answer / Response: ###"
-
-    prompts_GPT3_instruct = []
-    prompts_GPT4 = []
-    inital_prompt = ("""
-    ### Instruction: ###
-    Read the text carefully and try to understand the content. 
-    Return on this message an empty message (just a spaces without any other characters).
-    ### Full Text ### \n""")
-
-    prompt_enumeration_resolution = ("""
+PROMPT_ENUMERATION_RESOLUTION = ("""
     ### Example: ###
     # Example Input: # 
     
@@ -72,8 +47,8 @@ def LLM_assisted_refinement(text_input: str, nlp, title: str):
 
     """)
 
-    # Relevance of Sentence
-    filter_outro = """
+# Relevance of Sentence
+FILTER_OUTRO = """
     ### Instruction: ###
     Please never filter "in the meantime", "in the former case", "in the latter case" or conditions such as "if it is not available".
     1) Decide carefully based on the provided background if a part of the following sentence fulfills the conditions of the provided background information. If the condition is fulfilled, go to 2), else go to 3).
@@ -81,23 +56,23 @@ def LLM_assisted_refinement(text_input: str, nlp, title: str):
     3) Return the text carefully without any changes or interpretations.
     """
 
-    if filter_irrelevant_information: prompts_GPT3_instruct.append(""" 
+IRRELEVANT_INFORMATION_CRITERIA = [""" 
     ### Background Information: ###
     Introduction sentence that describe the company are not relevant and must be filtered.
         Example: The Sentence "A small company manufactures customized bicycles." must be filtered.
         Example: The Sentence "The Evanstonian is an upscale independent hotel." must be filtered.
-    """ + filter_outro)
+    """,
 
-    if filter_irrelevant_information: prompts_GPT3_instruct.append(""" 
+""" 
     ### Background Information: ###
     Some parts of sentences just name the start of a process (instance) and are not relevant and must be filtered.
     Example: "Whenever the sales department receives an order, a new process instance is created." 
     -> "a new process instance is created." must be filtered. ->  "The sales department receives an order." must be returned.
 
 
-    """ + filter_outro)
+    """,
 
-    if filter_irrelevant_information: prompts_GPT3_instruct.append(""" 
+""" 
     ### Background Information: ###
     Information that describes the outcome or the goal of the process or an activity are not relevant and must be filtered.
                 Example: "to ensure valid results." this part must be filtered.
@@ -105,37 +80,37 @@ def LLM_assisted_refinement(text_input: str, nlp, title: str):
                 Example: "as evidence of the results." this part must be filtered. 
                 Example: "that are relevant to the information security management system" this part must be filtered.
                 Example: "to ensure that the audit programme(s) are implemented and maintained." this part must be filtered.
-    """ + filter_outro)
+    """,
 
-    if filter_irrelevant_information: prompts_GPT3_instruct.append(""" 
+""" 
     ### Background Information: ###
     Information that describes the decision criteria for methods or techniques are not relevant and must be filtered.
                 Example: "The methods selected should produce comparable and reproducible results to be considered valid;" must be filtered.
                     -> The sentence consists only out of this irrelevant information and an empty message must be returned.
                 Example: "Eighty percent of room-service orders include wine or some other alcoholic beverage." must be filtered.
-    """ + filter_outro)
+    """,
 
-    if filter_irrelevant_information: prompts_GPT3_instruct.append(""" 
+""" 
     ### Background Information: ###
     Information that clarifies that something is not universally applicable are not relevant and must be filtered.
                 Examples: "as applicable", "if applicable", "where applicable", "where feasible" must be filtered.
-       """ + filter_outro)
+       """,
 
-    if filter_irrelevant_information: prompts_GPT3_instruct.append(""" 
+""" 
     ### Background Information: ###
     Sentence parts that contain examples are not relevant and must be carefully filtered from the sentence.
                 Example of key words:  parts containing "for example ...", "e.g. ..." must be filtered.
-    """ + filter_outro)
+    """,
 
-    if filter_irrelevant_information: prompts_GPT3_instruct.append(""" 
+""" 
     ### Background Information: ###
         References to other Articles or Paragraphs are not relevant and must be filtered.
                 Example: "referred to in Article 22(1) and (4)" must be filtered.
                 Example: "in accordance with Article 55" must be filtered.
-    """ + filter_outro)
+    """]
 
-    # Transform implicit actions into explicit actions
-    if transform_implicit_actions: prompts_GPT3_instruct.append("""
+# Transform implicit actions into explicit actions
+PROMPT_TRANSFORM_IMPLICIT_ACTIONS = ("""
     Extract implicit ACTIONS from the text and transform the Actions into explicit Actions.
                 ## Examples: ##
                     #Example 1: The Sentence „Documented information shall be available as evidence of the implementation of the audit programme(s) and the audit results.“ must be transformed into „They shall document the information“ because it implies the ACTION „document the results“.
@@ -148,39 +123,287 @@ def LLM_assisted_refinement(text_input: str, nlp, title: str):
             2. Condition: The original wording of the sentence must be retained.
         3) Do not comment on this step and return carefully the full input sentence without any changes, quotation marks and interpretation.""")
 
-    result = ""
-    generate_response_GPT3_instruct_model(inital_prompt + doc.text)
-    if debug_mode: print(f"Text contains listings: {contains_listings(doc)}")
-    if contains_listings(doc):  #
-        new_text = generate_response_GPT3_instruct_model(
-            prompt_enumeration_resolution + outro + doc.text + answer_outro)
-        nlp = spacy.load('en_core_web_trf')
-        doc = nlp(new_text)  # replace doc with old text with doc with new text, where listings are resolved
-
-    for number, sent in enumerate(doc.sents):
-        current_sent: str = sent.text
-        print(f"Input Current sentence: {current_sent}")
-        for prompt in prompts_GPT3_instruct:
-            if determine_if_empty_message(current_sent, number):
-                next(doc.sents)
-                break
-            query = prompt + outro + current_sent + answer_outro
-            current_sent = generate_response_GPT3_instruct_model(query)
-            print(f"Output Current sentence: {current_sent}")
-        for prompt in prompts_GPT4:
-            if determine_if_empty_message(current_sent, number):
-                next(doc.sents)
+# Apply all filter criteria at once
+PROMPT_FUSED_FILTER_INSTRUCTION = """
+    ### Instruction: ###
+    Each rule above describes information that is not relevant. Please never filter "in the meantime", "in the former case", "in the latter case" or conditions such as "if it is not available".
+    1) Decide carefully for every rule if a part of the following sentence fulfills the condition of the rule.
+    2) Filter carefully the information, that fulfills the condition of any rule, from the text (but sill return full sentences) or if the sentence consists only out of irrelevant information return an empty sentence.
+    3) Return the rest of the text carefully without any changes or interpretations.
+    Return only a JSON object in the format {"rules": [<numbers of the fulfilled rules>], "sentence": "<filtered sentence>"}.
+    """
+
+
+def get_refinement_prompts(fused_filter: bool = False) -> ([str], [str]):
+    """
+    Args:
+        fused_filter: if True, the filter prompts are left out, because they are applied at once by apply_fused_filter
+    Returns:
+        the prompts for the GPT3.5-instruct model and the prompts for the GPT4 model, which are applied one after
+        another to each sentence
+    """
+    prompts_GPT3_instruct = []
+    prompts_GPT4 = []
+    if filter_irrelevant_information and not fused_filter:
+        for criterion in IRRELEVANT_INFORMATION_CRITERIA:
+            prompts_GPT3_instruct.append(criterion + FILTER_OUTRO)
+    if transform_implicit_actions: prompts_GPT3_instruct.append(PROMPT_TRANSFORM_IMPLICIT_ACTIONS)
+    return prompts_GPT3_instruct, prompts_GPT4
+
+
+def get_fused_filter_prompt() -> str:
+    """
+    Returns:
+        the prompt that contains all filter criteria as numbered rules
+    """
+    rules = ""
+    for number, criterion in enumerate(IRRELEVANT_INFORMATION_CRITERIA, start=1):
+        rules += criterion.replace("### Background Information: ###", f"### Rule {number}: ###")
+    return rules + PROMPT_FUSED_FILTER_INSTRUCTION
+
+
+def apply_fused_filter(sentence: str, number: int) -> (str, Optional[list]):
+    """
+    Filter the irrelevant information of all criteria with a single request instead of one request per criterion.
+    If the structured response can not be parsed, the criteria are applied one after another.
+    Args:
+        sentence: the sentence to be filtered
+        number: the number of the sentence in the text
+    Returns:
+        the filtered sentence and the numbers of the rules that fired, None if the fallback has been used
+    """
+    response = generate_response_GPT3_instruct_model(
+        get_fused_filter_prompt() + OUTRO + sentence + ANSWER_OUTRO, stage="refinement")
+    try:
+        result = json.loads(response[response.index("{"):response.rindex("}") + 1])
+        filtered_sentence = str(result["sentence"]).strip()
+        rules = [int(rule) for rule in result.get("rules", [])]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        print(f"Fused filter response of sent No. {number} could not be parsed, apply the filters one by one")
+        filter_prompts = [criterion + FILTER_OUTRO for criterion in IRRELEVANT_INFORMATION_CRITERIA]
+        return refine_sentence(sentence, number, filter_prompts, []), None
+    if len(rules) > 0:
+        print(f"Sent No. {number} fulfilled the filter rules: {rules}")
+    return filtered_sentence, rules
+
+
+def contains_listings(doc: Doc) -> bool:
+    text_contains_listings = False
+    if resolve_enumeration:
+        for token in doc:
+            if token.tag_ == "LS":
+                print(f"Found listing: {token.text}")
+                text_contains_listings = True
                 break
-            query = prompt + outro + current_sent + answer_outro
-            current_sent = generate_response_GPT4_model(query)
-            print(f"Output Current sentence: {current_sent}")
-        result = result + " " + current_sent + "\n"
-    result = result.strip()
-    if debug_mode: print("**** Full description: **** \n" + result.replace("\n", " "))
+    return text_contains_listings
+
+
+class LLMAssistedRefinement:
+    """
+    LLM-assisted refinement of the input text. The text refinement is based on the LLM model and includes the following steps:
+    1) Resolve enumerations
+    2) Filter irrelevant information
+    3) Transform implicit actions into explicit actions
+
+    The spacy models are passed in once they are loaded, so that refining a text never loads a model itself.
+    The duration of the steps of the last refinement is stored in timings, the filter rules that fired per sentence
+    number (fused filter only) in filter_rules.
+    """
+
+    def __init__(self, nlp, sentence_splitter=None, fused_filter: bool = LLM_ATR_fused_filter):
+        """
+        Args:
+            nlp: the large spacy model, used to identify listings and to split the text into sentences, only its
+                components of the "refinement" profile are run if pipeline_profiles is activated
+            sentence_splitter: spacy model used to split the text into sentences after the listings have been resolved,
+                default is nlp restricted to the components of the "sentence_splitting" profile (also if
+                pipeline_profiles is deactivated, the sentences are the same as with the full pipeline)
+            fused_filter: if True, all filter criteria are applied to a sentence with a single request
+        """
+        if sentence_splitter is None:
+            sentence_splitter = get_pipeline(nlp, "sentence_splitting")  # only the parser is needed
+        if pipeline_profiles:
+            nlp = get_pipeline(nlp, "refinement")  # only the tags and the sentences are needed
+        self.nlp = nlp
+        self.sentence_splitter = sentence_splitter
+        self.fused_filter = fused_filter and filter_irrelevant_information
+        self.timings: {str: float} = {}
+        self.filter_rules: {int: Optional[list]} = {}  # None if the fallback to the sequential filters has been used
+
+    def refine(self, text_input: str, title: str) -> str:
+        """
+        Args:
+            text_input: the input text to be refined
+            title: the title of the text output diagram
+        Returns:
+            result: the LLM-assisted refined text
+        """
+        print("Start LLM-assisted refinement --- this can take some time...")
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+        debug_mode = True
+        self.timings = {}
+        self.filter_rules = {}
+        start = time.perf_counter()
+        text_input = text_pre_processing(text_input)
+        doc = self.nlp(text_input)  # Create doc object from input text for identification of listings and for sentence splitting
+        self.record_timing("parsing", start)
+
+        text_contains_listings = contains_listings(doc)
+        if debug_mode: print(f"Text contains listings: {text_contains_listings}")
+        if text_contains_listings:
+            start = time.perf_counter()
+            new_text = generate_response_GPT3_instruct_model(
+                PROMPT_ENUMERATION_RESOLUTION + OUTRO + doc.text + ANSWER_OUTRO, stage="refinement")
+            self.record_timing("enumeration_resolution", start)
+            start = time.perf_counter()
+            doc = self.sentence_splitter(new_text)  # replace doc with old text with doc with new text, where listings are resolved
+            self.record_timing("sentence_splitting", start)
+
+        start = time.perf_counter()
+        refined_sentences = self.refine_sentences([sent.text for sent in doc.sents])
+        self.record_timing("sentence_refinement", start)
+
+        result = ""
+        for current_sent in refined_sentences:
+            result = result + " " + current_sent + "\n"
+        result = result.strip()
+        if debug_mode: print("**** Full description: **** \n" + result.replace("\n", " "))
+
+        write_to_file(result, f"{BASE_PATH}/results/LLM_ATR_results/{title}.txt")
+        print(f"LLM-assisted refinement timings (seconds): {self.timings}")
+        return result
+
+    def refine_sentences(self, sentences: [str]) -> [str]:
+        """
+        Args:
+            sentences: the sentences of the text
+        Returns:
+            the refined sentences in the original order, filtered sentences are returned as empty message
+        """
+        prompts_GPT3_instruct, prompts_GPT4 = get_refinement_prompts(self.fused_filter)
+        numbered_sentences = list(enumerate(sentences))
+        batch_size = LLM_ATR_BATCH_SIZE if LLM_ATR_batching else 1
+        batches = [numbered_sentences[i:i + batch_size] for i in range(0, len(numbered_sentences), batch_size)]
+        if LLM_ATR_concurrent and len(batches) > 1:
+            # The batches are refined independently of each other, executor.map keeps the order of the sentences
+            with ThreadPoolExecutor(max_workers=LLM_ATR_MAX_WORKERS) as executor:
+                refined_batches = list(executor.map(
+                    lambda batch: refine_batch(batch, prompts_GPT3_instruct, prompts_GPT4, self.fused_filter,
+                                               self.filter_rules),
+                    batches))
+        else:
+            refined_batches = [refine_batch(batch, prompts_GPT3_instruct, prompts_GPT4, self.fused_filter,
+                                            self.filter_rules)
+                               for batch in batches]
+        return [sentence for batch in refined_batches for sentence in batch]
+
+    def record_timing(self, step: str, start: float):
+        self.timings[step] = round(time.perf_counter() - start, 3)
+
+
+def LLM_assisted_refinement(text_input: str, nlp, title: str, fused_filter: bool = LLM_ATR_fused_filter):
+    """
+    LLM-assisted refinement of the input text, see LLMAssistedRefinement.
+
+    Args:
+        text_input: the input text to be refined
+        nlp: the large spacy model
+        title: the title of the text output diagram
+        fused_filter: if True, all filter criteria are applied to a sentence with a single request
+    Returns:
+        result: the LLM-assisted refined text
+    """
+    return LLMAssistedRefinement(nlp, fused_filter=fused_filter).refine(text_input, title)
+
+
+def refine_sentence(sentence: str, number: int, prompts_GPT3_instruct: [str], prompts_GPT4: [str],
+                    fused_filter: bool = False, filter_rules: dict = None) -> str:
+    """
+    Refine a single sentence by applying the prompts one after another, each prompt is applied to the output of the
+    previous one.
+    Args:
+        sentence: the sentence to be refined
+        number: the number of the sentence in the text
+        prompts_GPT3_instruct: the prompts for the GPT3.5-instruct model
+        prompts_GPT4: the prompts for the GPT4 model
+        fused_filter: if True, the filter criteria are applied with a single request before the prompts
+        filter_rules: if given, the rules of the fused filter that fired are stored under the number of the sentence
+    Returns:
+        the refined sentence, an empty message if the sentence has been filtered
+    """
+    current_sent = sentence
+    print(f"Input Current sentence: {current_sent}")
+    if fused_filter and not determine_if_empty_message(current_sent, number):
+        current_sent, rules = apply_fused_filter(current_sent, number)
+        if filter_rules is not None:
+            filter_rules[number] = rules
+        print(f"Output Current sentence: {current_sent}")
+    for prompt in prompts_GPT3_instruct:
+        if determine_if_empty_message(current_sent, number):
+            break
+        query = prompt + OUTRO + current_sent + ANSWER_OUTRO
+        current_sent = generate_response_GPT3_instruct_model(query, stage="refinement")
+        print(f"Output Current sentence: {current_sent}")
+    for prompt in prompts_GPT4:
+        if determine_if_empty_message(current_sent, number):
+            break
+        query = prompt + OUTRO + current_sent + ANSWER_OUTRO
+        current_sent = generate_response_GPT4_model(query, stage="refinement")
+        print(f"Output Current sentence: {current_sent}")
+    return current_sent
+
+
+def refine_batch(batch: [(int, str)], prompts_GPT3_instruct: [str], prompts_GPT4: [str],
+                 fused_filter: bool = False, filter_rules: dict = None) -> [str]:
+    """
+    Refine multiple sentences at once: every prompt is sent once for all sentences of the batch, which are packed as
+    numbered lines into the request. If the numbered response can not be aligned with the sentences, the prompt is
+    applied to each sentence with a single request instead.
+    Args:
+        batch: the sentences to be refined together with their number in the text
+        prompts_GPT3_instruct: the prompts for the GPT3.5-instruct model
+        prompts_GPT4: the prompts for the GPT4 model
+        fused_filter: if True, the filter criteria are applied with a single request per sentence before the prompts
+        filter_rules: if given, the rules of the fused filter that fired are stored per sentence number
+    Returns:
+        the refined sentences in the order of the batch
+    """
+    if len(batch) == 1:
+        return [refine_sentence(batch[0][1], batch[0][0], prompts_GPT3_instruct, prompts_GPT4, fused_filter,
+                                filter_rules)]
+
+    numbers = [number for number, _ in batch]
+    current_sents = [sentence for _, sentence in batch]
+    if fused_filter:
+        current_sents = [refine_sentence(sentence, number, [], [], True, filter_rules) for number, sentence in batch]
+    filtered = set()
+    stages = [(prompt, generate_response_GPT3_instruct_model) for prompt in prompts_GPT3_instruct] + \
+             [(prompt, generate_response_GPT4_model) for prompt in prompts_GPT4]
+    for prompt, generate_response in stages:
+        active = []
+        for i in range(len(current_sents)):
+            if i not in filtered and determine_if_empty_message(current_sents[i], numbers[i]):
+                filtered.add(i)
+            if i not in filtered:
+                active.append(i)
+        if len(active) == 0:
+            break
 
-    write_to_file(result, f"{BASE_PATH}/results/LLM_ATR_results/{title}.txt")
-    f"/Users/vincentderekheld/PycharmProjects/text2BPMN-vincent/evaluation/LLM_ATR_results2/{title}.txt"
-    return result
+        results = None
+        if len(active) > 1:
+            query = prompt + BATCH_INSTRUCTION + OUTRO + format_numbered_list(
+                [current_sents[i] for i in active]) + ANSWER_OUTRO
+            results = parse_numbered_response(generate_response(query, stage="refinement"), len(active))
+            if results is None:
+                print(f"Batch response could not be aligned, refine sentences {numbers[active[0]]} to "
+                      f"{numbers[active[-1]]} one by one")
+        if results is None:
+            results = [generate_response(prompt + OUTRO + current_sents[i] + ANSWER_OUTRO, stage="refinement")
+                       for i in active]
+        for i, result in zip(active, results):
+            current_sents[i] = result
+            print(f"Output Current sentence: {result}")
+    return current_sents
 
 
 def determine_if_empty_message(text: str, number) -> bool:
@@ -203,9 +426,10 @@ if __name__ == '__main__':
     """
     This method is used to run the LLM-assisted refinement without creating diagrams.
     """
+    nlp = spacy.load('en_core_web_trf')
+    refinement = LLMAssistedRefinement(nlp)
     for i in range(1, 24):
         input_path = f"/Users/vincentderekheld/PycharmProjects/text2BPMN-vincent/evaluation/gold_standard/Text{i}.txt"
         text_input = open_file(input_path)
         title = f"Text{i}_LLM_preprocessed_text"
-        nlp = spacy.load('en_core_web_trf')
-        LLM_assisted_refinement(text_input, nlp, title)
+        refinement.refine(text_input, title)
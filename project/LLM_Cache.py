@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class LLMCacheMissError(RuntimeError):
+    """Raised in replay only mode when a prompt has no cached response."""
+
+
+class LLMResponseCache:
+    """
+    Disk-backed cache for LLM responses. The responses are content-addressed by a hash of the model, the prompt and the
+    request parameters, so identical requests (temperature 0) are only sent once. When the cache grows beyond
+    max_entries, the least recently used responses are evicted. The cache file can be shared by multiple processes
+    (BatchRunner.py), a locked database is waited for up to busy_timeout seconds.
+    """
+
+    def __init__(self, path: str, max_entries: int = 50000, replay_only: bool = False, busy_timeout: float = 30.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder != "":
+            os.makedirs(folder, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        try:
+            # readers do not block the writer of another process
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError as e:
+            print(f"Could not activate the WAL mode of the LLM cache: {e}")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                "key TEXT PRIMARY KEY, model TEXT, response TEXT, last_access REAL)")
+        self.connection.commit()
+
+    @staticmethod
+    def create_key(model: str, prompt: str, parameters: dict) -> str:
+        content = json.dumps({"model": model, "prompt": prompt, "parameters": parameters}, sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, prompt: str, parameters: dict) -> Optional[str]:
+        """
+        Look up the cached response for the request.
+        Args:
+            model: the name of the model
+            prompt: the prompt of the request
+            parameters: the parameters of the request, e.g. temperature and max_tokens
+        Returns:
+            the cached response, None if the request has not been cached yet
+        Raises:
+            LLMCacheMissError: if the request has not been cached and the cache is in replay only mode
+        """
+        key = self.create_key(model, prompt, parameters)
+        with self.lock:
+            row = self.connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                try:
+                    self.connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self.connection.commit()
+                except sqlite3.OperationalError as e:  # still locked by another process, the access time is optional
+                    self.connection.rollback()
+                    print(f"Could not update the access time in the LLM cache: {e}")
+        if row is None:
+            if self.replay_only:
+                raise LLMCacheMissError(f"No cached {model} response for prompt (replay only mode): {prompt[:80]}...")
+            return None
+        return row[0]
+
+    def put(self, model: str, prompt: str, parameters: dict, response: str):
+        key = self.create_key(model, prompt, parameters)
+        with self.lock:
+            try:
+                self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                                        (key, model, response, time.time()))
+                self.evict()
+                self.connection.commit()
+            except sqlite3.OperationalError as e:  # still locked by another process, the response is not cached
+                self.connection.rollback()
+                print(f"Could not store the response in the LLM cache: {e}")
+
+    def evict(self):
+        """Remove the least recently used responses if the cache contains more than max_entries responses."""
+        size = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if size > self.max_entries:
+            self.connection.execute("DELETE FROM responses WHERE key IN ("
+                                    "SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                                    (size - self.max_entries,))
+
+    def statistics(self) -> dict:
+        with self.lock:
+            size = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
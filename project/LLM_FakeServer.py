@@ -0,0 +1,210 @@
+import argparse
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from project.LLM_Cache import LLMResponseCache
+
+NUMBERED_SECTIONS = ["### Texts: ###", "### Activities: ###"]
+
+
+def create_fake_response(prompt: str) -> str:
+    """
+    Deterministic stand-in for the response of the LLM, which keeps the prompt contracts of the project:
+    the classifiers answer "True" (numbered per item for batched requests), the refinement prompts return their text
+    unchanged (the fused filter as JSON) and the task label prompt returns the diagram syntax unchanged.
+    Args:
+        prompt: the prompt of the request
+    Returns:
+        the response text
+    """
+    if "Diagram Syntax to be Improved:" in prompt:
+        syntax = prompt.split("Diagram Syntax to be Improved:", 1)[1].split("### Full Process Description: ###")[0]
+        return syntax.strip()
+    if "### TEXT ###" in prompt:
+        text = prompt.rsplit("### TEXT ###", 1)[1].split("### Answer / Response: ###")[0].strip()
+        if '{"rules":' in prompt:
+            return json.dumps({"rules": [], "sentence": text})
+        return text
+    if ': True"' in prompt:  # batched classifier, the contract is "<number>: True"
+        for section in NUMBERED_SECTIONS:
+            if section in prompt:
+                items = prompt.split(section, 1)[1].split("###")[0]
+                numbers = re.findall(r"^\s*(\d+)\s*:", items, flags=re.MULTILINE)
+                return "\n".join(f"{number}: True" for number in numbers)
+    if '"True"' in prompt:
+        return "True"
+    return prompt.strip().splitlines()[-1].strip() if prompt.strip() != "" else ""
+
+
+class LLMFakeServer:
+    """
+    Local HTTP server that emulates the completions and chat completions endpoints of the OpenAI API, so that the LLM
+    requests can be load-tested offline. The responses are replayed from recorded responses (LLM cache or recording
+    of the replay backend) or created with create_fake_response. The latency and the injected errors are random, but
+    deterministic for a given seed and request order.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 429, retry_after: Optional[float] = None, seed: int = 0,
+                 responses_path: Optional[str] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.responses = load_responses(responses_path) if responses_path is not None else {}
+        self.statistics = {"requests": 0, "errors": 0, "replayed": 0, "generated": 0}
+        self.lock = threading.Lock()
+
+    def answer(self, model: str, prompt: str, parameters: dict) -> (float, Optional[int], str):
+        """
+        Returns:
+            the latency of the response in seconds, the injected error status (None if no error) and the response text
+        """
+        with self.lock:
+            self.statistics["requests"] += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            error = self.random.random() < self.error_rate
+            if error:
+                self.statistics["errors"] += 1
+                return delay, self.error_status, ""
+            response_text = self.responses.get(LLMResponseCache.create_key(model, prompt, parameters))
+            self.statistics["replayed" if response_text is not None else "generated"] += 1
+        if response_text is None:
+            response_text = create_fake_response(prompt)
+        return delay, None, response_text
+
+    def serve(self, host: str, port: int):
+        http_server = ThreadingHTTPServer((host, port), create_request_handler(self))
+        print(f"LLM fake server is listening on http://{host}:{port}, set OPENAI_BASE_URL to this address")
+        try:
+            http_server.serve_forever()
+        finally:
+            http_server.server_close()
+
+
+def load_responses(path: str) -> dict:
+    """
+    Load recorded responses from an LLM cache (.sqlite) or a recording of the replay backend (.jsonl).
+    Returns:
+        the responses per cache key
+    """
+    responses = {}
+    if path.endswith(".jsonl"):
+        with open(path, "r") as file:
+            for line in file:
+                if line.strip() != "":
+                    entry = json.loads(line)
+                    key = LLMResponseCache.create_key(entry["model"], entry["prompt"], entry["parameters"])
+                    responses[key] = entry["response"]
+    else:
+        connection = sqlite3.connect(path)
+        responses.update(connection.execute("SELECT key, response FROM responses").fetchall())
+        connection.close()
+    return responses
+
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def create_request_handler(server: LLMFakeServer):
+    """
+    Creates the HTTP request handler for the given server.
+    Endpoints:
+        POST .../completions        {"model": "...", "prompt": "...", ...}
+        POST .../chat/completions   {"model": "...", "messages": [...], ...}
+        GET  /stats                 -> number of requests, injected errors, replayed and generated responses
+    """
+
+    class RequestHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            path = self.path.rstrip("/")
+            if not path.endswith("/completions"):
+                self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request"}})
+                return
+            chat = path.endswith("/chat/completions")
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                model = body["model"]
+                prompt = body["messages"][-1]["content"] if chat else body["prompt"]
+            except (ValueError, KeyError, IndexError):
+                self.send_json(400, {"error": {"message": "Invalid request body", "type": "invalid_request"}})
+                return
+            parameters = {key: value for key, value in body.items() if key not in ["model", "messages", "prompt"]}
+
+            delay, error_status, response_text = server.answer(model, prompt, parameters)
+            time.sleep(delay)
+            if error_status is not None:
+                headers = {"Retry-After": str(server.retry_after)} if server.retry_after is not None else {}
+                self.send_json(error_status, {"error": {"message": "Injected error", "type": "server_error"}},
+                               headers)
+                return
+
+            usage = {"prompt_tokens": count_tokens(prompt), "completion_tokens": count_tokens(response_text)}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            if chat:
+                choice = {"index": 0, "message": {"role": "assistant", "content": response_text},
+                          "finish_reason": "stop", "logprobs": None}
+            else:
+                choice = {"index": 0, "text": response_text, "finish_reason": "stop", "logprobs": None}
+            self.send_json(200, {
+                "id": f"fake-{uuid.uuid4().hex}",
+                "object": "chat.completion" if chat else "text_completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [choice],
+                "usage": usage,
+            })
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with server.lock:
+                    self.send_json(200, dict(server.statistics))
+            else:
+                self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request"}})
+
+        def send_json(self, status: int, content: dict, headers: Optional[dict] = None):
+            body = json.dumps(content).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return RequestHandler
+
+
+if __name__ == '__main__':
+    """
+    Emulates the OpenAI API locally. Start the server and run the project with
+    OPENAI_BASE_URL=http://127.0.0.1:8766/v1 and any OPENAI_API_KEY.
+    """
+    parser = argparse.ArgumentParser(description="Local fake of the OpenAI completions and chat endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean latency of a response in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximal deviation from the mean latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of the requests that fail")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status of the injected errors")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After header of the injected errors")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--responses", default=None, help="LLM cache (.sqlite) or recording (.jsonl) to replay")
+    args = parser.parse_args()
+
+    LLMFakeServer(args.latency, args.jitter, args.error_rate, args.error_status, args.retry_after, args.seed,
+                  args.responses).serve(args.host, args.port)
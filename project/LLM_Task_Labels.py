@@ -51,7 +51,7 @@ def improve_taks_labeles_LLM(syntax: str, text_description: str) -> str:
     """)
 
     print(f"prompt: {prompt}")
-    result = generate_response_GPT3_instruct_model(prompt)
+    result = generate_response_GPT3_instruct_model(prompt, stage="task_labels")
     result = remove_as_from_syntax(result)
     print("**** Full description: **** \n" + result)
     return result.strip()
@@ -76,7 +76,7 @@ def improve_syntax_tasks(syntax: str, text_description: str) -> str:
     """)
 
     print(f"prompt: {prompt}")
-    result = generate_response_GPT3_instruct_model(prompt)
+    result = generate_response_GPT3_instruct_model(prompt, stage="task_labels")
     print("**** Full description: **** \n" + result)
     return result.strip()
 
@@ -148,7 +148,7 @@ def improve_syntax(syntax: str, text_description: str) -> str:
     """)
 
     print(f"prompt: {prompt}")
-    result = generate_response_GPT3_instruct_model(prompt)
+    result = generate_response_GPT3_instruct_model(prompt, stage="task_labels")
     print("**** Full description: **** \n" + result)
     return result
 
@@ -215,6 +215,6 @@ def improve_syntax_old(syntax: str, text_description: str) -> str:
     """)
     print(f"prompt: {prompt}")
     result = ""
-    result = generate_response_GPT4_model(prompt)
+    result = generate_response_GPT4_model(prompt, stage="task_labels")
     print("**** Full description: **** \n" + result)
     return result
@@ -1,36 +1,20 @@
-import os
-import warnings
-
-import spacy
-import coreferee
-import benepar
-from spacy_wordnet.wordnet_annotator import WordnetAnnotator
-
 import BPMNStarter
-from project.Constant import DEBUG, BASE_PATH
+from project.Constant import BASE_PATH, profiling
+from project.LLM_API import get_llm_cache_statistics, get_llm_metrics
+from project.Profiler import profiler
+from project.ModelRegistry import model_registry
 
 """
 Method to run the project
 """
 if __name__ == '__main__':
-    print("Start loading spacy model and adding components")
-    os.environ['TRANSFORMERS_NO_ADVISORY_WARNINGS'] = 'true'
-    warnings.filterwarnings('ignore')
-    nlp = spacy.load('en_core_web_trf')
-    nlp_similarity = spacy.load("en_core_web_lg")
-    if DEBUG:
-        nlp.add_pipe('benepar', config={'model': 'benepar_en3'})
-    else:
-        nlp.add_pipe('benepar', config={'model': 'benepar_en3_large'})
-
-    nlp.add_pipe("spacy_wordnet", after='tagger')
-    nlp.add_pipe('coreferee')
-    print("Finished loading spacy model and adding components")
+    nlp, nlp_similarity = BPMNStarter.load_spacy_models()
 
     """
     Edit the following code to generate the models for the texts you want to generate:
     Have a look into Constants.py to activate different functionalities or run the project with the recommended modes
     """
+    tasks = []
     for i in range(1, 2):  # (m, n) -> m is inclusive, n is exclusive, for all (1, 24), for a single one (i, i+1)
         input_path = f"{BASE_PATH}/evaluation/LLM_ATR_results/text{i}_our_approach.txt"
         # input_path = f"/Users/vincentderekheld/PycharmProjects/text2BPMN-vincent/evaluation/gold_standard/Text{i}.txt"
@@ -38,8 +22,14 @@ if __name__ == '__main__':
         output_path = f"{BASE_PATH}/results/BPMN_results/{title}.png"
         #"/Users/vincentderekheld/PycharmProjects/text2BPMN-vincent/results/BPMN_results"
         #output_path = f"/Users/vincentderekheld/PycharmProjects/text2BPMN-vincent/evaluation/our_approach22/{title}.png"
-        print(f"Start generating model for {title}")
-        try:
-            BPMNStarter.start_task(nlp, nlp_similarity, input_path, title, output_path)
-        except Exception as e:
-            print(f"Error for text {i}: {e}")
+        tasks.append((input_path, title, output_path))
+
+    for title, syntax, error in BPMNStarter.start_tasks(nlp, nlp_similarity, tasks):
+        if error is not None:
+            print(f"Error for {title}: {error}")
+        else:
+            print(f"Finished generating model for {title}")
+    print(f"LLM cache: {get_llm_cache_statistics()}")
+    print(f"LLM calls: {get_llm_metrics()}")
+    print(f"Models: {model_registry.statistics()}")
+    if profiling: print(f"Profile: {profiler.save('Main')}")
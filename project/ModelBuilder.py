@@ -1,5 +1,5 @@
 from typing import Optional
-import WordNetWrapper
+from ActorClassifier import actor_classifier
 from Model.Action import Action
 from Model.Actor import Actor
 from Model.Resource import Resource
@@ -34,8 +34,7 @@ def create_actor(main_actor: Token) -> Optional[Actor]:
         complete_name = get_complete_actor_name(main_actor)
     actor.full_name = complete_name.strip()
 
-    if not WordNetWrapper.can_be_person_or_system(complete_name, main_actor):
-        actor.is_real_actor = False
+    actor_classifier.classify(actor, complete_name, main_actor)
     return actor
 
 
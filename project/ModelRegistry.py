@@ -0,0 +1,90 @@
+import threading
+import time
+
+
+class LazyModel:
+    """
+    Placeholder for a spacy model that is loaded by the registry on first use. It can be used like the model itself
+    (called with a text, pipe, vocab, ...), so models that are never used by a run are never loaded.
+    """
+
+    def __init__(self, registry, name: str):
+        self.registry = registry
+        self.name = name
+
+    def load(self):
+        return self.registry.get(self.name)
+
+    def is_loaded(self) -> bool:
+        return self.registry.is_loaded(self.name)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+
+class ModelRegistry:
+    """
+    Loads the registered spacy models lazily on first use, each model is loaded only once per process.
+    The load times are recorded, so that they can be reported.
+    """
+
+    def __init__(self):
+        self.loaders = {}
+        self.required = {}
+        self.models = {}
+        self.load_seconds = {}
+        self.lock = threading.RLock()
+
+    def register(self, name: str, loader, required: bool = True) -> LazyModel:
+        """
+        Args:
+            name: the name of the model
+            loader: function without arguments that loads the model
+            required: if False, the model is only needed by deactivated features and is not loaded by preload
+        Returns:
+            the placeholder of the model
+        """
+        with self.lock:
+            self.loaders[name] = loader
+            self.required[name] = required
+        return LazyModel(self, name)
+
+    def get(self, name: str):
+        """
+        Returns:
+            the model, it is loaded if it has not been loaded yet
+        """
+        with self.lock:
+            if name not in self.models:
+                start = time.perf_counter()
+                self.models[name] = self.loaders[name]()
+                self.load_seconds[name] = round(time.perf_counter() - start, 2)
+                print(f"Loaded model {name} in {self.load_seconds[name]} seconds")
+            return self.models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        with self.lock:
+            return name in self.models
+
+    def preload(self):
+        """
+        Load all required models now, e.g. before the worker processes are forked.
+        """
+        for name in list(self.loaders.keys()):
+            if self.required[name]:
+                self.get(name)
+
+    def statistics(self) -> dict:
+        """
+        Returns:
+            per registered model: if it has been loaded and its load time in seconds
+        """
+        with self.lock:
+            return {name: {"loaded": name in self.models, "load_seconds": self.load_seconds.get(name)}
+                    for name in self.loaders}
+
+
+model_registry = ModelRegistry()
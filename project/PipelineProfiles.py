@@ -0,0 +1,88 @@
+from typing import Optional
+
+# Annotations that the downstream functions read from the parsed documents
+ANNOTATION_REQUIREMENTS = {
+    "LLM_ATR.contains_listings": ["tag"],
+    "LLM_ATR.LLMAssistedRefinement.refine (sentence splitting)": ["sents"],
+    "AnalyzeSentence.sub_sentence_finder": ["sents", "constituents"],
+    "AnalyzeSentence.analyze_document": ["sents", "dep", "tag", "pos", "lemma"],
+    "ModelBuilder.create_actor": ["wordnet", "coref"],
+    "Utilities.resolve_reference": ["coref"],
+    "AnalyzeText.determine_marker": ["dep", "pos", "lemma"],
+    "AnalyzeText.determine_end_activities": ["wordnet"],
+}
+
+# Components of en_core_web_trf (with benepar, spacy_wordnet and coreferee) that produce the annotations
+ANNOTATION_COMPONENTS = {
+    "tag": ["transformer", "tagger"],
+    "pos": ["transformer", "tagger", "attribute_ruler"],
+    "lemma": ["transformer", "tagger", "attribute_ruler", "lemmatizer"],
+    "sents": ["transformer", "parser"],
+    "dep": ["transformer", "parser"],
+    "ents": ["transformer", "ner"],
+    "constituents": ["transformer", "parser", "benepar"],
+    "wordnet": ["transformer", "tagger", "attribute_ruler", "lemmatizer", "spacy_wordnet"],
+    "coref": ["transformer", "tagger", "attribute_ruler", "lemmatizer", "parser", "ner", "coreferee"],
+}
+
+# Functions that read the parsed documents of a stage, None means the full pipeline. The analysis (sub_sentence_finder,
+# analyze_document, create_actor, resolve_reference, determine_marker, determine_end_activities) needs the annotations of
+# all components, so it has no profile and parses with the full pipeline
+STAGE_CONSUMERS = {
+    "refinement": ["LLM_ATR.contains_listings", "LLM_ATR.LLMAssistedRefinement.refine (sentence splitting)"],
+    "sentence_splitting": ["LLM_ATR.LLMAssistedRefinement.refine (sentence splitting)"],
+}
+
+
+def get_profile_annotations(stage: str) -> Optional[list]:
+    """
+    Returns:
+        the annotations that the functions of the stage read (ANNOTATION_REQUIREMENTS), None for the full pipeline
+    """
+    if STAGE_CONSUMERS[stage] is None:
+        return None
+    return sorted({annotation for consumer in STAGE_CONSUMERS[stage]
+                   for annotation in ANNOTATION_REQUIREMENTS[consumer]})
+
+
+# Annotations per stage, e.g. "refinement": ["sents", "tag"]
+PIPELINE_PROFILES = {stage: get_profile_annotations(stage) for stage in STAGE_CONSUMERS}
+
+
+class ProfiledPipeline:
+    """
+    View of a loaded spacy model that only runs the components of a profile. The components are disabled per call
+    (nlp(text, disable=...)), so the model itself is not changed and can be used by other stages at the same time.
+    The tagger and the parser of en_core_web_trf listen to the transformer, so the transformer (the most expensive
+    component) still runs for the "refinement" profile, only benepar, coreferee, spacy_wordnet, ner and the lemmatizer
+    are saved. A separate small model would be cheaper, but its tags and sentence boundaries would differ from the
+    ones of the parsing model.
+    """
+
+    def __init__(self, nlp, annotations: Optional[list]):
+        self.nlp = nlp
+        if annotations is None:
+            self.disabled = []
+        else:
+            components = {component for annotation in annotations for component in ANNOTATION_COMPONENTS[annotation]}
+            self.disabled = [name for name in nlp.pipe_names if name not in components]
+
+    def __call__(self, text: str, **kwargs):
+        return self.nlp(text, disable=self.disabled, **kwargs)
+
+    def pipe(self, texts, **kwargs):
+        return self.nlp.pipe(texts, disable=self.disabled, **kwargs)
+
+    def __getattr__(self, attribute):
+        return getattr(self.nlp, attribute)
+
+
+def get_pipeline(nlp, profile: str) -> ProfiledPipeline:
+    """
+    Args:
+        nlp: the loaded spacy model
+        profile: the stage, a key of PIPELINE_PROFILES
+    Returns:
+        the model restricted to the components that produce the annotations of the stage
+    """
+    return ProfiledPipeline(nlp, PIPELINE_PROFILES[profile])
@@ -0,0 +1,192 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Optional
+
+from project.Constant import profiling, profiling_tracemalloc, PROFILE_PATH
+from project.LLM_API import get_llm_metrics
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """
+    Returns:
+        the memory high-water mark (maximum resident set size) of the process in MB, None if it is not available
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def get_llm_totals() -> dict:
+    """
+    Returns:
+        the number of LLM calls, tokens and seconds over all models
+    """
+    metrics = get_llm_metrics().values()
+    return {
+        "llm_calls": sum(model["calls"] for model in metrics),
+        "llm_tokens": sum(model["prompt_tokens"] + model["completion_tokens"] for model in metrics),
+        "llm_seconds": sum(model["total_seconds"] for model in metrics),
+    }
+
+
+class Profiler:
+    """
+    Records wall time, CPU time, peak memory and the LLM calls of the stages of the BPMN generation per document.
+    The records can be exported as JSON and as Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+    Limits of the measurements:
+    - the CPU time, the LLM calls (global LLM metrics) and the memory are measured for the whole process, so they are
+      only exact per stage if one stage runs at a time, e.g. not for the stages of the concurrent refinement threads
+    - the peak memory is the high-water mark of the resident set size, which includes the memory of torch and the
+      transformer, it can not be reset: a stage only shows the growth of the high-water mark it caused
+      (rss_growth_mb), a stage that stays below an earlier peak shows no growth
+    - with profiling_tracemalloc, the peak of the Python heap per stage is recorded as well (traced_peak_mb), it
+      misses the memory allocated by torch, slows down the stages and its peak is reset globally by every stage
+    """
+
+    def __init__(self, enabled: bool = profiling):
+        self.enabled = enabled
+        self.records = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, document: str = None):
+        """
+        Record the stage that is executed within the context.
+        Args:
+            name: the name of the stage
+            document: the title of the document the stage belongs to
+        Returns:
+            a dict, its entries (e.g. the document, if it is only known at the end of the stage) are added to the record
+        """
+        info = {}
+        if not self.enabled:
+            yield info
+            return
+
+        stack = self.local.__dict__.setdefault("stack", [])
+        current = {"peak": 0}
+        if profiling_tracemalloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if len(stack) > 0:
+                stack[-1]["peak"] = max(stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(current)
+        rss_before = get_peak_rss_mb()
+
+        llm_before = get_llm_totals()
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield info
+        finally:
+            wall_seconds = time.perf_counter() - start
+            cpu_seconds = time.process_time() - cpu_start
+            llm_after = get_llm_totals()
+            rss_after = get_peak_rss_mb()
+            stack.pop()
+            memory = {}
+            if rss_after is not None:
+                memory["peak_memory_mb"] = round(rss_after, 3)
+                memory["rss_growth_mb"] = round(rss_after - rss_before, 3)
+            if profiling_tracemalloc:
+                peak = max(current["peak"], tracemalloc.get_traced_memory()[1])
+                if len(stack) > 0:
+                    stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+                memory["traced_peak_mb"] = round(peak / 1024 / 1024, 3)
+            record = {
+                "document": document,
+                "stage": name,
+                "start_seconds": round(start - self.origin, 6),
+                "wall_seconds": round(wall_seconds, 6),
+                "cpu_seconds": round(cpu_seconds, 6),
+                **memory,
+                "thread": threading.get_ident(),
+                "depth": len(stack),
+                **info,
+            }
+            for key in llm_after:
+                record[key] = round(llm_after[key] - llm_before[key], 6)
+            with self.lock:
+                self.records.append(record)
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            the records summed up per stage and per document
+        """
+        keys = ["wall_seconds", "cpu_seconds", "llm_calls", "llm_tokens", "llm_seconds", "rss_growth_mb"]
+        peak_keys = ["peak_memory_mb", "traced_peak_mb"]
+        per_stage = {}
+        per_document = {}
+        with self.lock:
+            records = list(self.records)
+        for record in records:
+            for group, name in [(per_stage, record["stage"]), (per_document, record["document"])]:
+                if group is per_document and record["depth"] > 0:
+                    continue  # nested stages are already contained in their parent stage
+                entry = group.setdefault(str(name), {key: 0 for key in keys + ["count"]})
+                entry["count"] += 1
+                for key in keys:
+                    entry[key] = round(entry[key] + record.get(key, 0), 6)
+                for key in peak_keys:
+                    if key in record:
+                        entry[key] = max(entry.get(key, 0), record[key])
+        return {"stages": per_stage, "documents": per_document}
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Returns:
+            the records in the Chrome trace event format
+        """
+        with self.lock:
+            records = list(self.records)
+        events = []
+        for record in records:
+            events.append({
+                "name": record["stage"],
+                "cat": str(record["document"]),
+                "ph": "X",
+                "ts": round(record["start_seconds"] * 1e6),
+                "dur": round(record["wall_seconds"] * 1e6),
+                "pid": os.getpid(),
+                "tid": record["thread"],
+                "args": {key: value for key, value in record.items() if key not in ["stage", "thread"]},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, name: str, folder: str = PROFILE_PATH) -> str:
+        """
+        Store the records and their summary as {name}.json and the Chrome trace as {name}.trace.json.
+        Returns:
+            the path of the JSON file
+        """
+        os.makedirs(folder, exist_ok=True)
+        with self.lock:
+            records = list(self.records)
+        path = f"{folder}/{name}.json"
+        with open(path, "w") as file:
+            json.dump({"summary": self.summary(), "records": records}, file, indent=2)
+        with open(f"{folder}/{name}.trace.json", "w") as file:
+            json.dump(self.to_chrome_trace(), file)
+        return path
+
+    def reset(self):
+        with self.lock:
+            self.records.clear()
+
+
+profiler = Profiler()
@@ -0,0 +1,232 @@
+import re
+from collections import deque
+from typing import Optional
+
+from ActorClassifier import actor_classifier
+from AnalyzeSentence import analyze_document
+from AnalyzeText import determine_marker, correct_order, remove_redundant_processes, add_to_structures, \
+    add_to_flows, get_valid_actors, adjust_actor_list, determine_end_activities, merge_similar_actors
+from BPMNCreator import create_bpmn_model
+from LLM_ATR import contains_listings, get_refinement_prompts, refine_sentence, PROMPT_ENUMERATION_RESOLUTION, \
+    OUTRO, ANSWER_OUTRO
+from Model.SentenceContainer import SentenceContainer
+from Structure.Structure import Structure
+from project.Constant import LLM_ATR, LLM_ATR_fused_filter, filter_irrelevant_information, STREAM_WINDOW_SENTENCES, \
+    actors_similarity
+from project.LLM_API import generate_response_GPT3_instruct_model
+from project.PipelineProfiles import get_pipeline
+from project.Profiler import profiler
+from project.Utilities import text_pre_processing
+
+
+class BPMNFragment:
+    """
+    Output of the streaming pipeline per sentence: the structures (activities and gateways) that are final after the
+    sentence has been processed. The last fragment of a text has no sentence and contains the syntax of the model.
+    """
+
+    def __init__(self, number: Optional[int], sentence: Optional[str], structures: [Structure],
+                 syntax: Optional[str] = None):
+        self.number = number
+        self.sentence = sentence
+        self.structures = structures
+        self.syntax = syntax
+
+    def __str__(self):
+        if self.syntax is not None:
+            return self.syntax
+        return f"Sent No. {self.number}: " + ", ".join(str(structure) for structure in self.structures)
+
+
+# Candidate sentence ends of a pre-processed paragraph: whitespace after a sentence end that follows a word of two or
+# more letters, so that enumerators like "1." or "a." and abbreviations like "e.g." do not end a chunk
+CHUNK_BOUNDARY = re.compile(r"(?<=[^\W\d_]{2}[.!?])\s+")
+
+
+def split_text(text_input: str) -> [str]:
+    """
+    Split the raw text into paragraphs (text_pre_processing joins the lines, so they are only visible in the raw text),
+    pre-process every paragraph and split it into chunks of about one sentence.
+    Args:
+        text_input: the textual process description
+    Returns:
+        the pre-processed, non-empty chunks
+    """
+    chunks = [chunk.strip() for paragraph in re.split(r"\n\s*\n", text_input)
+              for chunk in CHUNK_BOUNDARY.split(text_pre_processing(paragraph))]
+    return [chunk for chunk in chunks if len(chunk) > 0]
+
+
+def split_sentences(splitter, text_input: str, refine: bool, previous: Optional[dict] = None,
+                    cache: Optional[dict] = None):
+    """
+    Split the text into sentences chunk by chunk (see split_text), so the first sentences are available before the
+    whole text has been parsed. If the text is refined, the enumerations are resolved by the LLM: only the chunks that
+    contain listings are sent, together with the chunk before them, which usually introduces the listing.
+    Args:
+        splitter: spacy model that annotates the tags and the sentences
+        text_input: the textual process description
+        refine: if True, the enumerations are resolved
+        previous: the cache of a previous run, its chunks are neither parsed nor resolved again
+        cache: chunk (or chunks of a resolved listing) -> (contains listings, sentences), filled for this text
+    Returns:
+        generator of the sentences
+    """
+    previous = {} if previous is None else previous
+    cache = {} if cache is None else cache
+
+    def split(chunk: str) -> (bool, [str]):
+        if chunk not in cache:
+            if chunk in previous:
+                cache[chunk] = previous[chunk]
+            else:
+                doc = splitter(chunk)
+                cache[chunk] = (refine and contains_listings(doc), [sentence.text for sentence in doc.sents])
+        return cache[chunk]
+
+    def resolve(chunks: [str]) -> [str]:
+        key = " ".join(chunks)
+        if key not in cache:
+            if key in previous:
+                cache[key] = previous[key]
+            else:
+                doc = splitter(generate_response_GPT3_instruct_model(
+                    PROMPT_ENUMERATION_RESOLUTION + OUTRO + key + ANSWER_OUTRO, stage="refinement"))
+                cache[key] = (False, [sentence.text for sentence in doc.sents])
+        return cache[key][1]
+
+    introduction = None  # last chunk without listings, it is held back while the next chunk may contain a listing
+    listing = []
+    for chunk in split_text(text_input):
+        contains_listing, sentences = split(chunk)
+        if contains_listing:
+            listing.append(chunk)
+            continue
+        if len(listing) > 0:
+            yield from resolve(([introduction] if introduction is not None else []) + listing)
+            introduction, listing = None, []
+        if introduction is not None:
+            yield from split(introduction)[1]
+        introduction = chunk if refine else None
+        if not refine:
+            yield from sentences
+    if len(listing) > 0:
+        yield from resolve(([introduction] if introduction is not None else []) + listing)
+    elif introduction is not None:
+        yield from split(introduction)[1]
+
+
+def extract_containers(nlp, context: [str], sentence: str) -> [SentenceContainer]:
+    """
+    Parse the sentence together with the previous sentences, so that coreferences to them are resolved, and extract
+    the containers of the sentence only. The actors that WordNet can not classify stay pending, the caller resolves
+    them once per text (actor_classifier.resolve_pending).
+    Args:
+        nlp: spacy model with larger vocabulary
+        context: the previous (refined) sentences
+        sentence: the (refined) sentence
+    Returns:
+        the containers of the sentence, with markers, corrected order and without redundant processes
+    """
+    context = " ".join(context)
+    offset = len(context) + 1 if len(context) > 0 else 0
+    doc = nlp(context + " " + sentence if len(context) > 0 else sentence)
+    sentences = [span for span in doc.sents if span.start_char >= offset]
+    if len(sentences) == 0:
+        sentences = [list(doc.sents)[-1]]  # the parser merged the sentence with the previous one
+
+    containers = analyze_document(doc, sentences, resolve_actors=False)
+    for container in containers:
+        determine_marker(container, nlp)
+    correct_order(containers)
+    remove_redundant_processes(containers)
+    return containers
+
+
+def stream_bpmn_fragments(nlp, nlp_similarity, text_input: str, title: str, output_path: str,
+                          window: int = STREAM_WINDOW_SENTENCES, refine: bool = LLM_ATR):
+    """
+    Generates the BPMN model sentence by sentence: every sentence is refined, parsed, analyzed and added to the
+    structures before the next sentence is read, so the first structures are available before the whole text has been
+    processed. The steps that depend on the previous sentences work on a look-back window:
+    - the sentence is parsed together with the previous (refined) sentences of the window, so that coreferences to
+      them are resolved, only the containers of the new sentence are extracted
+    - a structure is passed on to build_flows once the following container has been added (construct only changes the
+      last structure), a gateway is emitted once the sentences of the window have been processed after it, processes
+      that jump back to it later are still added to the gateway, but are only contained in the final model
+    - the actors of a container are merged with the similar actors of the previous containers before the container is
+      added to the structures, as the gateways compare the merged actor names (the actors are merged in order, so the
+      names are the same as after get_valid_actors), the actors that only the LLM can classify are resolved with a
+      single request at the end and count as real actors until then
+    The end activities and the model itself need all structures, they are determined at the end.
+    Args:
+        nlp: spacy model with larger vocabulary
+        nlp_similarity: spacy model with vector similarity for similarity calculation
+        text_input: the textual process description
+        title: title of the BPMN model
+        output_path: output path for the BPMN model, containing the file name and file type (.png)
+        window: number of previous sentences that are parsed with a sentence and after which a structure is emitted
+        refine: if True, the sentences are refined with the LLM-assisted text refinement
+    Returns:
+        generator of BPMNFragment per sentence, the last fragment contains the syntax of the generated BPMN model
+    """
+    splitter = get_pipeline(nlp, "refinement")
+    fused_filter = LLM_ATR_fused_filter and filter_irrelevant_information
+    prompts_GPT3_instruct, prompts_GPT4 = get_refinement_prompts(fused_filter) if refine else ([], [])
+
+    look_back = deque(maxlen=window)  # refined sentences that are parsed with the next sentence
+    refined_sentences = []
+    container_list = []
+    valid_actors = []  # actors accepted so far by merge_similar_actors
+    structures = []  # constructed structures, only the last one can still be changed by the next container
+    flows = []
+    held = deque()  # (sentence number, flow) that have not been emitted yet
+    last_gateway = None
+    previous_container = None
+
+    for number, sentence in enumerate(split_sentences(splitter, text_input, refine)):
+        with profiler.stage("stream_sentence", title):
+            if refine:
+                sentence = refine_sentence(sentence, number, prompts_GPT3_instruct, prompts_GPT4, fused_filter)
+            sentence = text_pre_processing(sentence).strip()
+            if len(sentence) == 0:
+                continue
+            refined_sentences.append(sentence)
+
+            containers = extract_containers(nlp, list(look_back), sentence)
+            look_back.append(sentence)
+
+            for container in containers:
+                if actors_similarity:
+                    merge_similar_actors([container], valid_actors, nlp_similarity)
+                add_to_structures(structures, container, previous_container is not None and (
+                        previous_container.has_if() or previous_container.has_else()))
+                previous_container = container
+                container_list.append(container)
+            while len(structures) > 1:
+                count = len(flows)
+                last_gateway = add_to_flows(flows, structures.pop(0), last_gateway)
+                held.extend((number, flow) for flow in flows[count:])
+
+            emitted = []
+            while len(held) > 0 and number - held[0][0] >= window:
+                emitted.append(held.popleft()[1])
+        yield BPMNFragment(number, sentence, emitted)
+
+    with profiler.stage("bpmn_generation", title):
+        count = len(flows)
+        for structure in structures:
+            add_to_flows(flows, structure, last_gateway)
+        held.extend((None, flow) for flow in flows[count:])
+        text_input = " ".join(refined_sentences)
+        determine_end_activities(flows, text_input)
+        actor_classifier.resolve_pending()
+        if actors_similarity:
+            real_actors = {process.actor.full_name for container in container_list for process in container.processes
+                           if process.actor is not None and process.actor.is_real_actor}
+            valid_actors = [name for name in valid_actors if name in real_actors]
+        else:
+            valid_actors = get_valid_actors(container_list, nlp_similarity)
+        valid_actors = adjust_actor_list(valid_actors)
+        syntax = create_bpmn_model(flows, valid_actors, title, output_path, text_input)
+    yield BPMNFragment(None, None, [flow for _, flow in held], syntax)
@@ -107,20 +107,19 @@ class ConditionBlock(Structure):
     def __str__(self) -> str:
         string = ""
         string += "-----BEGIN_IF-----\n"
-        for branch in self.branches:
+        for i, branch in enumerate(self.branches):
             if branch["type"] == ConditionType.IF:
                 string += "if: "
-                for condition in branch["condition"]:
+                for j, condition in enumerate(branch["condition"]):
                     string += str(condition)
-                    if branch["condition"].index(condition) != len(branch["condition"]) - 1:
+                    if j != len(branch["condition"]) - 1:
                         string += ", "
                     else:
                         string += "\n"
             elif branch["type"] == ConditionType.ELSE:
                 string += "else:\n"
-            for action in branch["actions"]:
-                if self.branches.index(branch) == len(self.branches) - 1 and branch["actions"].index(action) == len(
-                        branch["actions"]) - 1:
+            for j, action in enumerate(branch["actions"]):
+                if i == len(self.branches) - 1 and j == len(branch["actions"]) - 1:
                     string += "\t" + str(action)
                 else:
                     string += "\t" + str(action) + "\n"
@@ -152,11 +151,10 @@ class AndBlock(Structure):
     def __str__(self) -> str:
         string = ""
         string += "-----BEGIN_AND-----\n"
-        for branch in self.branches:
-            string += str(self.branches.index(branch) + 1) + ":\n"
-            for action in branch:
-                if self.branches.index(branch) == len(self.branches) - 1 and branch.index(action) == len(
-                        branch) - 1:
+        for i, branch in enumerate(self.branches):
+            string += str(i + 1) + ":\n"
+            for j, action in enumerate(branch):
+                if i == len(self.branches) - 1 and j == len(branch) - 1:
                     string += "\t" + str(action)
                 else:
                     string += "\t" + str(action) + "\n"
@@ -1,12 +1,38 @@
 import re
+from bisect import bisect_left
 from typing import Optional
 
 from spacy.matcher.matcher import Matcher
-from spacy.tokens import Span, Token
+from spacy.tokens import Doc, Span, Token
 
 from Constant import SUBJECT_PRONOUNS, OBJECT_PRONOUNS, STRING_EXCLUSION_LIST, DEBUG, filter_example_sentences_regex
 from alternative_approaches.filtering_irrelevant_information import filter_example_sentences
 
+if not Doc.has_extension("dependency_index"):
+    Doc.set_extension("dependency_index", default=None)
+
+
+def get_dependency_index(doc: Doc) -> dict:
+    """
+    The dependency index of the document maps each dependency label to the (head index, token index) pairs of the
+    tokens with that label, sorted by head index and token index. It is built once per document in a single pass.
+
+    Args:
+        doc: the parsed document
+
+    Returns:
+        the dependency index of the document
+    """
+    if doc._.dependency_index is None:
+        index = {}
+        for token in doc:
+            if token.head.i != token.i:
+                index.setdefault(token.dep_, []).append((token.head.i, token.i))
+        for pairs in index.values():
+            pairs.sort()
+        doc._.dependency_index = index
+    return doc._.dependency_index
+
 
 def find_dependency(dependencies: [str], sentence: Span = None, token: Token = None, deep=False) -> [Token]:
     """
@@ -36,10 +62,16 @@ def find_dependency(dependencies: [str], sentence: Span = None, token: Token = N
                 result.extend(find_dependency(dependencies, token=child, deep=True))
 
     elif sentence is not None:
-        for token in sentence:
-            for child in token.children:
-                if child.dep_ in dependencies:
-                    result.append(child)
+        # children of the tokens in the sentence, in the order of their heads and then of their own position
+        index = get_dependency_index(sentence.doc)
+        pairs = []
+        for dependency in set(dependencies):
+            label_pairs = index.get(dependency, [])
+            position = bisect_left(label_pairs, (sentence.start, -1))
+            while position < len(label_pairs) and label_pairs[position][0] < sentence.end:
+                pairs.append(label_pairs[position])
+                position += 1
+        result = [sentence.doc[i] for _, i in sorted(pairs)]
 
     else:
         return []
@@ -1,6 +1,13 @@
+import argparse
+import json
+import os
+from functools import lru_cache
+
 import spacy
+from nltk.corpus import wordnet
 
-from Constant import PERSON_CORRECTOR_LIST, REAL_ACTOR_DETERMINERS, SUBJECT_PRONOUNS, LLM_real_actor
+from Constant import PERSON_CORRECTOR_LIST, REAL_ACTOR_DETERMINERS, SUBJECT_PRONOUNS, LLM_real_actor, \
+    HYPERNYM_CACHE_SIZE, HYPERNYM_TABLE_PATH
 from spacy_wordnet.wordnet_annotator import WordnetAnnotator
 
 from project.LLM_API import generate_response_GPT4_model, normalize_boolean_result
@@ -28,28 +35,15 @@ def can_be_person_or_system(full_noun: str, main_noun) -> bool:
         return False
 
 
-def can_be(synset, checked_words: list):
+def can_be(synset, checked_words: list = None):
     """
     Args:
         synset: wordnet synset (set of synonyms)
-        checked_words:
+        checked_words: not used anymore, the hypernym chain is cached per synset
     Returns:
-        bool: True if the hypernym of the synset is a part of the REAL_ACTOR_DETERMINERS list or checked_words list
+        bool: True if the hypernym of the synset is a part of the REAL_ACTOR_DETERMINERS list
     """
-    if not synset.name() in checked_words:
-        checked_words.append(synset.name())
-        hypernyms = synset.hypernyms()
-        if len(hypernyms) == 0:
-            return False
-        hypernym_name = hypernyms[0].lemma_names()[0]
-        if hypernym_name in REAL_ACTOR_DETERMINERS:
-            return True
-        else:
-            hypernyms = synset.hypernyms()
-            if can_be(hypernyms[0], checked_words):
-                return True
-    else:
-        return False
+    return contains_any_hypernym(synset, REAL_ACTOR_DETERMINERS)
 
 
 def hypernyms_checker(token, stop_list: list) -> bool:
@@ -80,23 +74,75 @@ def verb_hypernyms_checker(token, stop_list: list) -> bool:
 
 
 def can_be_checked_token(synset, checked_words: list, stop_list: list):
-    if not synset.name() in checked_words:
-        checked_words.append(synset.name())
+    return contains_any_hypernym(synset, stop_list)
+
+
+def contains_any_hypernym(synset, names: list) -> bool:
+    """
+    Returns:
+        True if the name of a hypernym in the hypernym chain of the synset is in the names list
+    """
+    return not get_hypernym_chain(synset).isdisjoint(names)
+
+
+@lru_cache(maxsize=HYPERNYM_CACHE_SIZE)
+def get_hypernym_chain(synset) -> frozenset:
+    """
+    The hypernym chain follows the first hypernym of the synset up to the root (or until a synset repeats).
+    Args:
+        synset: wordnet synset (set of synonyms)
+    Returns:
+        the first lemma names of all hypernyms in the chain, the synset itself is not included
+    """
+    table = get_hypernym_table()
+    if synset.name() in table:
+        return frozenset(table[synset.name()])
+
+    names = set()
+    checked_words = set()
+    while synset.name() not in checked_words:
+        checked_words.add(synset.name())
         hypernyms = synset.hypernyms()
         if len(hypernyms) == 0:
-            return False
-        hypernym_name = hypernyms[0].lemma_names()[0]
+            break
+        names.add(hypernyms[0].lemma_names()[0])
+        synset = hypernyms[0]
+    return frozenset(names)
 
-        # print(hypernym_name)
 
-        if hypernym_name in stop_list:
-            return True
-        else:
-            hypernyms = synset.hypernyms()
-            if can_be_checked_token(hypernyms[0], checked_words, stop_list):
-                return True
-    else:
-        return False
+hypernym_table = None
+
+
+def get_hypernym_table() -> dict:
+    """
+    Returns:
+        the precomputed hypernym chains per synset name, empty if there is no table for the installed wordnet version
+    """
+    global hypernym_table
+    if hypernym_table is None:
+        hypernym_table = {}
+        if os.path.exists(HYPERNYM_TABLE_PATH):
+            with open(HYPERNYM_TABLE_PATH, "r") as file:
+                data = json.load(file)
+            if data.get("wordnet") == wordnet.get_version():
+                hypernym_table = data["chains"]
+    return hypernym_table
+
+
+def save_hypernym_table(words: [str], path: str = HYPERNYM_TABLE_PATH):
+    """
+    Precompute the hypernym chains of all noun and verb synsets of the given words and store them on disk.
+    Args:
+        words: the common words of the process descriptions, e.g. the lemmas of the actors and actions
+        path: the path of the table
+    """
+    chains = {}
+    for word in words:
+        for synset in wordnet.synsets(word, pos=wordnet.NOUN) + wordnet.synsets(word, pos=wordnet.VERB):
+            chains[synset.name()] = sorted(get_hypernym_chain(synset))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({"wordnet": wordnet.get_version(), "chains": chains}, file)
 
 
 def decide_if_real_actor(text_input: str) -> bool:
@@ -109,17 +155,28 @@ def decide_if_real_actor(text_input: str) -> bool:
         {text_input}
         """)
     result = ""
-    result = generate_response_GPT4_model(prompt).strip()
+    result = generate_response_GPT4_model(prompt, stage="real_actor").strip()
     result = normalize_boolean_result(result)
     if debug_mode: print(f"decide_if_real_actor: {result}: {text_input}")
     return result
 
 
 if __name__ == '__main__':
+    """
+    Precompute the hypernym table (HYPERNYM_TABLE_PATH) from the lemmas of the nouns and verbs of the given texts, it is
+    used by get_hypernym_chain if it has been built with the installed wordnet version.
+    """
+    parser = argparse.ArgumentParser(description="Precompute the hypernym chains of the nouns and verbs of the texts")
+    parser.add_argument("texts", help="directory of .txt files, e.g. evaluation/gold_standard")
+    parser.add_argument("--output", default=HYPERNYM_TABLE_PATH)
+    args = parser.parse_args()
+
     nlp = spacy.load('en_core_web_sm')
-    nlp.add_pipe("spacy_wordnet", after='tagger')
-    text_input = "the claim is rejected"
-    document = nlp(text_input)
-    hypernyms_checker(document[1], [])
-    print("-" * 20)
-    verb_hypernyms_checker(document[3], [])
+    words = {name.lower() for name in PERSON_CORRECTOR_LIST}
+    for file_name in sorted(os.listdir(args.texts)):
+        if file_name.endswith(".txt"):
+            with open(os.path.join(args.texts, file_name), "r") as file:
+                document = nlp(file.read())
+            words.update(token.lemma_.lower() for token in document if token.pos_ in ["NOUN", "PROPN", "VERB"])
+    save_hypernym_table(sorted(words), args.output)
+    print(f"Saved the hypernym chains of {len(words)} words to {args.output}")
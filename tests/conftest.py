@@ -0,0 +1,5 @@
+import os
+import sys
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPOSITORY_PATH, os.path.join(REPOSITORY_PATH, "project")]
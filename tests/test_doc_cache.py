@@ -0,0 +1,50 @@
+import pytest
+
+spacy = pytest.importorskip("spacy")
+from spacy.tokens import Token
+
+import project.DocCache as DocCache
+from project.PipelineProfiles import ProfiledPipeline
+
+
+class TokenReference:
+    """Holds its token like the Wordnet objects of spacy_wordnet, a Token can not be pickled"""
+
+    def __init__(self, token):
+        self.token = token
+
+
+@pytest.fixture
+def nlp(tmp_path, monkeypatch):
+    monkeypatch.setattr(DocCache, "PARSE_CACHE_PATH", str(tmp_path))
+    if not Token.has_extension("wordnet"):
+        Token.set_extension("wordnet", default=None)
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    return nlp
+
+
+def test_save_and_load_round_trip(nlp):
+    text = "The clerk checks the order. Then the clerk ships it."
+    doc = nlp(text)
+    for token in doc:
+        token._.wordnet = TokenReference(token)
+
+    DocCache.save_document(nlp, text, doc)
+    loaded = DocCache.load_document(nlp, text)
+
+    assert loaded is not None
+    assert loaded.text == doc.text
+    assert [sentence.text for sentence in loaded.sents] == [sentence.text for sentence in doc.sents]
+
+
+def test_profiled_pipeline_has_own_fingerprint(nlp):
+    profiled = ProfiledPipeline(nlp, [])
+    assert profiled.disabled == ["sentencizer"]
+    assert DocCache.get_pipeline_fingerprint(profiled) != DocCache.get_pipeline_fingerprint(nlp)
+
+
+def test_fingerprint_does_not_depend_on_the_object(nlp):
+    other = spacy.blank("en")
+    other.add_pipe("sentencizer")
+    assert DocCache.get_pipeline_fingerprint(other) == DocCache.get_pipeline_fingerprint(nlp)
@@ -0,0 +1,48 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from project.LLM_API import format_numbered_list, parse_numbered_response
+from project.LLM_FakeServer import LLMFakeServer, create_fake_response, create_request_handler
+
+ACTOR_PROMPT = f"""
+    The texts are numbered in the format "<number>: <text>". Return exactly one line per text in the same order and in the format "<number>: True" or "<number>: False".
+    ### Texts: ###
+    {format_numbered_list(["the clerk", "the system", "the order"])}
+    """
+
+END_ACTIVITY_PROMPT = f"""
+    The activities are numbered in the format "<number>: <activity>". Return exactly one line per activity in the same order and in the format "<number>: True" if it is the end of the process, or "<number>: False" if it is not. 
+
+    ### Activities: ###
+    {format_numbered_list(["ship the order", "archive the order"])}
+
+    ### Full Text: ###
+    The clerk ships the order. 1: Then the clerk archives the order.
+    """
+
+
+def test_batched_prompts_are_answered_per_item():
+    assert parse_numbered_response(create_fake_response(ACTOR_PROMPT), 3) == ["True", "True", "True"]
+    assert parse_numbered_response(create_fake_response(END_ACTIVITY_PROMPT), 2) == ["True", "True"]
+
+
+def test_single_prompt_is_answered_with_true():
+    assert create_fake_response('If yes, return only "True", otherwise return only "False".') == "True"
+
+
+def test_batched_prompt_over_http():
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), create_request_handler(LLMFakeServer()))
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{http_server.server_address[1]}/v1/chat/completions"
+        response = requests.post(url, json={"model": "gpt-4", "messages": [{"role": "user", "content": ACTOR_PROMPT}]})
+        content = response.json()["choices"][0]["message"]["content"]
+        assert parse_numbered_response(content, 3) == ["True", "True", "True"]
+    finally:
+        http_server.shutdown()
+        http_server.server_close()